@@ -8,6 +8,8 @@
 # other wxPython and matplotlib examples.
 
 import sys, os, glob
+import multiprocessing
+from optparse import OptionParser
 
 # import needed wxPython modules
 import wx
@@ -24,9 +26,19 @@ import matplotlib.font_manager as font_manager
 
 import numpy as np
 
+import ascdata
+import envelope
+
 class MainApp(wx.App):
+    def __init__(self, filenames, pool=None):
+        # used by OnInit, which is called by wx.App.__init__
+        self.filenames = filenames
+        self.pool = pool
+        wx.App.__init__(self, False)
+
     def OnInit(self):
-       frame = PlotFrame("GENESIS 3 Plot Demo", (50, 60), (640, 640))
+       frame = PlotFrame("GENESIS 3 Plot Demo", (50, 60), (640, 640),
+           self.filenames, self.pool)
        frame.Show()
        self.SetTopWindow(frame)
        return True
@@ -43,16 +55,19 @@ class PlotFrame(wx.Frame):
         panel is an instance of wxPanel, used for the main panel, to hold
         canvas, an instance of MPL FigureCanvasWxAgg.
     """    
-    def __init__(self, title, pos, size):
+    def __init__(self, title, pos, size, filenames=[], pool=None):
         wx.Frame.__init__(self, None, wx.ID_ANY, title, pos, size)
         # define some variables to be shared among functions below
         # default filename list will be either empty or from args
-        self.filenames = sys.argv[1:]
+        self.filenames = filenames
         # python 2.5 and later hack to remove duplicates: list to set to list
         self.filenames = list(set(self.filenames))
         self.plot_type = 'generic'
         # format string for plot - default is color black
         self.plot_format = 'k'
+        # pool of processes used to read the files, or None to read them
+        # in this process
+        self.pool = pool
 
         #    Make the main Matplotlib panel for plots
         self.create_main_panel()  # creates canvas
@@ -205,28 +220,34 @@ class PlotFrame(wx.Frame):
     #   Functions to generate or read (x,y) data and plot it
     # -------------------------------------------------------
 
-    def plot_file(self):
+    def plot_file(self, data=None):
         # print 'Plotting %s' % self.file
-        x = []; y = []
-        fp = open(self.file, 'r')
-        # print 'Opened %s' % self.file
-        for line in fp.readlines():
-            data = line.split(" ")
-            x.append(data[0]); y.append(data[1])
-        self.axes.plot(x, y, self.plot_format)
+        if data is None:
+            data = ascdata.load_columns(self.file)
+        # long traces are drawn as their min/max envelope at the current zoom
+        envelope.plot_envelope(self.axes, data[:, 0], data[:, 1],
+            self.plot_format)
 
     def plot_data_files(self):
         formats = ['k', 'r', 'b', 'g', 'm', 'c']
         plotnum = 0
         if len(self.filenames) > 0:
+            found_files = []
             for self.file in self.filenames:
+                if os.path.exists(self.file):
+                    found_files.append(self.file)
+                else:
+                    print '*** Error: Incorrect file name or path specified'
+            # the files are read by the processes of self.pool, and plotted
+            # in order
+            loaded = ascdata.load_files(found_files, pool=self.pool)
+            for self.file, data, error in loaded:
                 self.plot_format = formats[plotnum % len(formats)]
                 try:
-                    if os.path.exists(self.file):
-                        self.plot_file()
-                        plotnum += 1
-                    else:
-                        print '*** Error: Incorrect file name or path specified'
+                    if error is not None:
+                        raise IOError(error)
+                    self.plot_file(data)
+                    plotnum += 1
                 # I need to do better error handling!
                 except:
                     print 'An error ocurred'
@@ -563,5 +584,18 @@ by using the Pan or Zoom buttons.
         self.statusbar.SetStatusText('')
                 
 if __name__ == '__main__':
-    app = MainApp(False)
-    app.MainLoop()
+    parser = OptionParser(usage="%prog [OPTIONS] [files]")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1,
+        help="number of processes for reading files (default 1)")
+    (options, args) = parser.parse_args()
+    # The worker processes are started before the wx application, so that
+    # they are not forked from a process with a running GUI.
+    pool = None
+    if options.jobs > 1:
+        pool = multiprocessing.Pool(options.jobs)
+    try:
+        app = MainApp(args, pool)
+        app.MainLoop()
+    finally:
+        if pool is not None:
+            pool.terminate()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+# ascdata - functions for reading the time series files written by the
+# GENESIS asc_file object, which are plotted with plotVm.py, G3Plot.py,
+# gipyplot.py and the plotPSD scripts.  Each line of the file holds the
+# values of one output step, separated by spaces, usually beginning with
+# the simulation time:
+#
+#   0 -0.0692059
+#   0.0001 -0.0679766
+#
+# The file may be plain text, or text compressed with bzip2 or gzip.  Blank
+# lines and comment lines beginning with '#' are skipped.
+
+import os
+import bz2
+import gzip
+import shutil
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+# Number of bytes of text read and parsed at a time
+BLOCK_BYTES = 1 << 22
+
+# Directory for the arrays passed from loading processes, if it exists.
+# Files in it are kept in memory rather than written to disk.
+SHARED_DIR = '/dev/shm'
+
+def open_text_file(filename):
+    '''
+    Return an open file object for filename, which may be plain text or
+    text compressed with bzip2 or gzip.  The format is found from the
+    first bytes of the file.
+    '''
+    fp = open(filename, 'rb')
+    magic = fp.read(3)
+    fp.close()
+    if magic == 'BZh':
+        return bz2.BZ2File(filename)
+    if magic[:2] == '\x1f\x8b':
+        return gzip.GzipFile(filename)
+    return open(filename)
+
+def _parse_lines(lines, ncols):
+    '''
+    Convert a list of lines to a (nrows, ncols) array one line at a time.
+    This is only used for a block that can't be converted in one pass,
+    because of comments, text lines, or lines with missing values.  Lines
+    with fewer than ncols values, or that aren't numbers, are skipped, and
+    extra values are ignored.
+    '''
+    rows = []
+    for line in lines:
+        items = line.split()
+        if len(items) < ncols:
+            continue
+        try:
+            rows.append([float(x) for x in items[:ncols]])
+        except ValueError:
+            continue
+    return np.array(rows, dtype=float).reshape(-1, ncols)
+
+def _count_columns(text):
+    ''' Return the number of values on the first line of data in text '''
+    for line in text.splitlines():
+        items = line.split()
+        if items and not items[0].startswith('#'):
+            return len(items)
+    return None
+
+def line_counts(text, nlines):
+    '''
+    Return the number of items separated by white space on each of the
+    nlines lines of text, found without splitting the lines.
+    '''
+    chars = np.frombuffer(text, dtype=np.uint8)
+    newline = chars == ord('\n')
+    space = newline | (chars == ord(' ')) | (chars == ord('\t')) | \
+        (chars == ord('\r'))
+    # an item starts with a character that follows a space
+    starts = ~space
+    starts[1:] &= space[:-1]
+    line = np.cumsum(newline)[starts]
+    return np.bincount(line, minlength=nlines)[:nlines]
+
+def _parse_text(text, ncols):
+    '''
+    Convert the lines of text to a (nrows, ncols) array, with a single call
+    to np.fromstring if every line has ncols values, or line by line.  The
+    number of values on each line is checked, as ragged lines may still
+    add up to a whole number of rows.
+    '''
+    values = np.fromstring(text, sep=' ')
+    nlines = text.count('\n') + (not text.endswith('\n'))
+    if values.size == nlines*ncols and \
+            np.all(line_counts(text, nlines) == ncols):
+        return values.reshape(-1, ncols)
+    return _parse_lines(text.splitlines(), ncols)
+
+def _iter_text_blocks(fp, block_bytes):
+    '''
+    Generator that reads the open file fp in blocks of about block_bytes,
+    and yields the text of each block ending at a line break.  Reading
+    large blocks is much faster than reading lines from a BZ2File or
+    GzipFile.
+    '''
+    rest = ''
+    while True:
+        text = fp.read(block_bytes)
+        if not text:
+            break
+        end = text.rfind('\n') + 1
+        if end == 0:
+            rest += text
+            continue
+        yield rest + text[:end]
+        rest = text[end:]
+    if rest.strip():
+        yield rest
+
+def iter_columns(filename, ncols=None, block_bytes=BLOCK_BYTES):
+    '''
+    Generator that reads an asc_file data file in blocks of about
+    block_bytes, and yields the values of each block as a (nrows, ncols)
+    float array, with one row per line.  The number of columns is taken
+    from the first line of data, unless ncols is given.  The text of each
+    block is converted with a single call to np.fromstring; a block with
+    comments or ragged lines is converted line by line instead.
+    '''
+    fp = open_text_file(filename)
+    try:
+        for text in _iter_text_blocks(fp, block_bytes):
+            if ncols is None:
+                ncols = _count_columns(text)
+                if ncols is None:
+                    continue
+            yield _parse_text(text, ncols)
+    finally:
+        fp.close()
+
+def load_columns(filename, ncols=None, block_bytes=BLOCK_BYTES):
+    '''
+    Read an asc_file data file and return its values as a (nrows, ncols)
+    float array, with one row per line, as read by iter_columns.
+    '''
+    blocks = list(iter_columns(filename, ncols, block_bytes))
+    if not blocks:
+        return np.zeros((0, ncols or 0))
+    return np.concatenate(blocks)
+
+class FollowedFile(object):
+    '''
+    FollowedFile reads an asc_file output file that is still being written
+    by a running simulation.  Each call to update reads only the text added
+    to the file since the last one, and appends the values of its complete
+    lines to an array that grows as needed, so the file is never read
+    twice.  After an update, the rows it added start at first_new, which
+    is 0 if the file was read again from the start.  The file must be
+    plain text.
+    '''
+    def __init__(self, filename, ncols=None):
+        self.filename = filename
+        self.ncols = ncols
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.rest = ''
+        self.nrows = 0
+        self.first_new = 0
+        self.values = None
+
+    def data(self):
+        ''' Return the (nrows, ncols) array of the values read so far '''
+        if self.values is None:
+            return np.zeros((0, self.ncols or 0))
+        return self.values[:self.nrows]
+
+    def update(self):
+        '''
+        Read the lines appended to the file, and return True if the data
+        has changed.  If the file has become shorter, e.g. when a new run
+        writes it again, it is read again from the start.
+        '''
+        try:
+            size = os.path.getsize(self.filename)
+        except OSError:
+            return False
+        changed = False
+        if size < self.offset:
+            changed = self.nrows > 0
+            self.reset()
+        self.first_new = self.nrows
+        if size == self.offset:
+            return changed
+        fp = open(self.filename, 'rb')
+        try:
+            fp.seek(self.offset)
+            text = fp.read(size - self.offset)
+        finally:
+            fp.close()
+        self.offset += len(text)
+        text = self.rest + text
+        end = text.rfind('\n') + 1
+        self.rest = text[end:]
+        text = text[:end]
+        if self.ncols is None:
+            self.ncols = _count_columns(text)
+            if self.ncols is None:
+                return changed
+        rows = _parse_text(text, self.ncols)
+        if len(rows) == 0:
+            return changed
+        nrows = self.nrows + len(rows)
+        if self.values is None or nrows > len(self.values):
+            values = np.empty((max(2*nrows, 1024), self.ncols))
+            values[:self.nrows] = self.data()
+            self.values = values
+        self.values[self.nrows:nrows] = rows
+        self.nrows = nrows
+        return True
+
+def _load_shared(job):
+    '''
+    Load a file in a worker process of load_files, and save the array in
+    the directory tmpdir.  Return the name of the saved array, and None,
+    or None and an error message.
+    '''
+    filename, tmpdir = job
+    try:
+        data = load_columns(filename)
+        fd, path = tempfile.mkstemp(suffix='.npy', dir=tmpdir)
+        os.close(fd)
+        np.save(path, data)
+    except Exception, e:
+        return None, '%s: %s' % (filename, e)
+    return path, None
+
+def load_files(filenames, jobs=1, pool=None):
+    '''
+    Generator that loads each of filenames with load_columns, and yields
+    (filename, data, error) in the order of filenames, where data is the
+    array or None, and error None or a message if the file can't be read.
+    With jobs > 1, the files are parsed at the same time by a pool of jobs
+    processes, or by pool, a multiprocessing.Pool that is kept open for
+    later calls, e.g. one started by a GUI before its windows are made.
+    Each worker saves its array in SHARED_DIR, where it is memory mapped by
+    this process, so that the data is not copied through a pipe.  The
+    arrays are then read only.
+    '''
+    own_pool = pool is None
+    if own_pool:
+        jobs = min(jobs, len(filenames))
+    else:
+        # the shared pool is used for more than one file
+        jobs = len(filenames)
+    if jobs <= 1:
+        for filename in filenames:
+            try:
+                yield filename, load_columns(filename), None
+            except Exception, e:
+                yield filename, None, '%s: %s' % (filename, e)
+        return
+    if os.path.isdir(SHARED_DIR) and os.access(SHARED_DIR, os.W_OK):
+        tmpdir = tempfile.mkdtemp(prefix='ascdata', dir=SHARED_DIR)
+    else:
+        tmpdir = tempfile.mkdtemp(prefix='ascdata')
+    if own_pool:
+        pool = multiprocessing.Pool(jobs)
+    try:
+        results = pool.imap(_load_shared, [(f, tmpdir) for f in filenames])
+        for n, (path, error) in enumerate(results):
+            filename = filenames[n]
+            if path is None:
+                yield filename, None, error
+                continue
+            data = np.load(path, mmap_mode='r')
+            # the mapping stays valid after the file is removed
+            os.remove(path)
+            yield filename, data, None
+    finally:
+        if own_pool:
+            pool.terminate()
+        shutil.rmtree(tmpdir, ignore_errors=True)
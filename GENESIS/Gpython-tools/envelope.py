@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+# envelope - level of detail plotting of long time series for plotVm.py and
+# G3Plot.py.  A trace of millions of points is drawn as the envelope of its
+# minimum and maximum values over each pixel column of the axes, so that
+# the time taken to draw it depends on the width of the plot, and not the
+# length of the trace.  The envelope is made from a pyramid of the min and
+# max over blocks of 4, 8, 16 ... points, computed once when the trace is
+# plotted, and is recomputed whenever the x-axis limits change, e.g. when
+# zooming or panning with the Navigation Toolbar.  Because the maximum of
+# each column is kept, spike peaks remain visible at any zoom.  gipyplot.py
+# draws the many columns of a file together in the same way, as a single
+# LineCollection.
+
+import numpy as np
+from matplotlib.collections import LineCollection
+
+# Smallest block of points in the pyramid is 2**MIN_LEVEL
+MIN_LEVEL = 2
+
+class EnvelopePyramid(object):
+    '''
+    EnvelopePyramid holds the min and max of the values y over blocks of
+    2**k points, for k from MIN_LEVEL up to a single block, and returns the
+    points to draw for a range of x.  x must be in increasing order.  y
+    may also be a 2-D array with a row for each of several traces sampled
+    at the same x, whose envelopes are then found together.
+    '''
+    def __init__(self, x, y):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.levels = {}
+        n = self.y.shape[-1]
+        size = 1 << MIN_LEVEL
+        if n < 2*size:
+            return
+        nblocks = -(-n // size)
+        pad = np.empty(self.y.shape[:-1] + (nblocks*size,), dtype=self.y.dtype)
+        pad[..., :n] = self.y
+        pad[..., n:] = self.y[..., -1:]
+        blocks = pad.reshape(self.y.shape[:-1] + (nblocks, size))
+        ymin = blocks.min(axis=-1)
+        ymax = blocks.max(axis=-1)
+        level = MIN_LEVEL
+        while True:
+            self.levels[level] = (ymin, ymax)
+            if ymin.shape[-1] < 2:
+                break
+            if ymin.shape[-1] % 2:
+                ymin = np.concatenate((ymin, ymin[..., -1:]), axis=-1)
+                ymax = np.concatenate((ymax, ymax[..., -1:]), axis=-1)
+            ymin = np.minimum(ymin[..., 0::2], ymin[..., 1::2])
+            ymax = np.maximum(ymax[..., 0::2], ymax[..., 1::2])
+            level += 1
+
+    def envelope(self, xmin, xmax, npix):
+        '''
+        Return the (x, y) points to draw for the range xmin to xmax on an
+        axes npix pixels wide.  If there are more than two points for each
+        pixel, the level with at least npix blocks in the range is used,
+        and each block is drawn as a vertical line from its min to its max.
+        '''
+        n = len(self.x)
+        i0 = max(0, np.searchsorted(self.x, xmin, 'left') - 1)
+        i1 = min(n, np.searchsorted(self.x, xmax, 'right') + 1)
+        npts = i1 - i0
+        npix = max(1, int(npix))
+        level = min((npts // npix).bit_length() - 1, max(self.levels or [0]))
+        if npts <= 2*npix or level < MIN_LEVEL:
+            return self.x[i0:i1], self.y[..., i0:i1]
+        size = 1 << level
+        ymin, ymax = self.levels[level]
+        j0 = i0 // size
+        j1 = min(ymin.shape[-1], -(-i1 // size))
+        xs = np.repeat(self.x[j0*size:j1*size:size], 2)
+        ys = np.empty(ymin.shape[:-1] + xs.shape, dtype=ymin.dtype)
+        ys[..., 0::2] = ymin[..., j0:j1]
+        ys[..., 1::2] = ymax[..., j0:j1]
+        return xs, ys
+
+def _segments(xs, ys):
+    ''' Return the (ntraces, npoints, 2) segments of a LineCollection '''
+    segments = np.empty(ys.shape + (2,))
+    segments[..., 0] = xs
+    segments[..., 1] = ys
+    return segments
+
+class EnvelopeLine(object):
+    '''
+    EnvelopeLine keeps the Line2D of a trace plotted on axes, or the
+    LineCollection of several traces, set to the envelope of the data for
+    the current x-axis limits and axes width.
+    '''
+    def __init__(self, axes, line, pyramid):
+        self.axes = axes
+        self.line = line
+        self.pyramid = pyramid
+        self.limits = None
+        axes.callbacks.connect('xlim_changed', self.update)
+
+    def update(self, axes):
+        if self.line.axes is None:
+            # the line was removed from the plot
+            return
+        xmin, xmax = sorted(axes.get_xlim())
+        npix = axes.bbox.width
+        if self.limits == (xmin, xmax, npix):
+            return
+        self.limits = (xmin, xmax, npix)
+        xs, ys = self.pyramid.envelope(xmin, xmax, npix)
+        if ys.ndim == 1:
+            self.line.set_data(xs, ys)
+        else:
+            self.line.set_segments(_segments(xs, ys))
+
+def plot_envelope(axes, x, y, *args, **kwargs):
+    '''
+    Plot y against x on axes, as with axes.plot(x, y, *args, **kwargs),
+    and return the Line2D.  If x is in increasing order, the line shows the
+    envelope of the data for the current x-axis limits, and is updated when
+    they change.  The envelope of the whole trace is drawn at first, so
+    that autoscaling sets the limits to the full range of the data.
+    '''
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(x) < 2 or np.any(np.diff(x) < 0):
+        return axes.plot(x, y, *args, **kwargs)[0]
+    pyramid = EnvelopePyramid(x, y)
+    xmin, xmax = x[0], x[-1]
+    xs, ys = pyramid.envelope(xmin, xmax, axes.bbox.width)
+    line = axes.plot(xs, ys, *args, **kwargs)[0]
+    line.envelope = EnvelopeLine(axes, line, pyramid)
+    return line
+
+def collection_envelope(axes, x, ys, **kwargs):
+    '''
+    Plot each row of the 2-D array ys against x on axes as a single
+    LineCollection, made with the keyword arguments kwargs, and return it.
+    The data limits are set once from the range of the whole array.  If
+    x is in increasing order, the collection shows the envelopes of the
+    traces for the current x-axis limits, as with plot_envelope.
+    '''
+    x = np.asarray(x)
+    ys = np.asarray(ys)
+    if len(x) < 2 or np.any(np.diff(x) < 0):
+        pyramid = None
+        xs = x
+    else:
+        pyramid = EnvelopePyramid(x, ys)
+        xs, ys = pyramid.envelope(x[0], x[-1], axes.bbox.width)
+    lines = LineCollection(_segments(xs, ys), **kwargs)
+    axes.add_collection(lines, autolim=False)
+    axes.update_datalim([(np.nanmin(x), np.nanmin(ys)),
+        (np.nanmax(x), np.nanmax(ys))])
+    axes.autoscale_view()
+    if pyramid is not None:
+        lines.envelope = EnvelopeLine(axes, lines, pyramid)
+    return lines
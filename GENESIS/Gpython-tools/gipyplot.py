@@ -26,8 +26,15 @@ from matplotlib.backends.backend_wxagg import NavigationToolbar2WxAgg
 
 from matplotlib.backends.backend_wx import _load_bitmap
 from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.colors import is_color_like
 from numpy.random import rand
 
+import numpy as np
+
+import ascdata
+import envelope
+
 
 #----------------------------------------------------------------------
 
@@ -76,7 +83,7 @@ class G3Plot(wx.Frame):
     Wildcard file names are accepted.
 
     """
-    def __init__(self, files, verbose=False,
+    def __init__(self, files, verbose=False, jobs=1, follow=None,
                  title='(x,y) data', formt='k',
                  xlabel='X', ylabel='Y',
                  ymin=-0.1, ymax=0.05,
@@ -96,6 +103,8 @@ class G3Plot(wx.Frame):
 
         # Just in case we need to have these values stored
         self.verbose = verbose
+        self.jobs = jobs
+        self.follow = follow
         self.title = title
         self.formt = formt
         self.xlabel = xlabel
@@ -109,6 +118,8 @@ class G3Plot(wx.Frame):
            print "xmin, xmax, ymin, ymax: ", self.xmin, self.xmax, self.ymin, self.ymax
 
         self.subplot = []
+        # Number of traces drawn as LineCollections, for color cycling
+        self.num_traces = 0
         # Give the figure size in inches, and rez
         self.figure = Figure(figsize=(6.4,4.8), dpi=100)
         # Wait to create the subplot when AddSubplot() is called
@@ -117,7 +128,10 @@ class G3Plot(wx.Frame):
 #        self.axes.set_xlabel(self.xlabel)
 #        self.axes.set_ylabel(self.ylabel)
 
-        self.PlotFiles(files) # create axes and plot all the data
+        if self.follow is None:
+            self.PlotFiles(files) # create axes and plot all the data
+        else:
+            self.FollowFiles(files) # plot the data written so far
         self.canvas = FigureCanvas(self, -1, self.figure)
 
         self.sizer = wx.BoxSizer(wx.VERTICAL)
@@ -148,18 +162,28 @@ class G3Plot(wx.Frame):
         self.SetSizer(self.sizer)
         self.Fit()
 
+        if self.follow is not None:
+            # check the files for new data every follow seconds
+            self.timer = wx.Timer(self)
+            self.Bind(wx.EVT_TIMER, self.OnFollow, self.timer)
+            self.timer.Start(max(int(1000*self.follow), 10))
+
 #----------------------------------------------------------------------
 
     def PlotFiles(self, file_list):
         """
         Loops through all files and makes a call to _PlotFile to plot
-        each data set to the canvas.
+        each data set to the canvas.  With more than one job, the files
+        are read by a pool of processes, and plotted in order as they
+        are loaded.
         """
         self.plot_data = []
 
         if self.verbose:
 
-            print "Processing %d files." % len(file_list)
+            print "Processing %d files with %d jobs." % (len(file_list), self.jobs)
+
+        found_files = []
             
         for f in file_list:
 
@@ -167,29 +191,213 @@ class G3Plot(wx.Frame):
 
             if os.path.isfile(this_file):
 
-                try:
+                found_files.append(this_file)
+                
+            else:
+
+                print "File Error: '%s' is not found." % this_file
+
+        for this_file, data, error in ascdata.load_files(found_files, self.jobs):
+
+            try:
+
+                if error is not None:
+
+                    raise IOError(error)
                     
-                    self._PlotFile(this_file)
+                self._PlotFile(this_file, data)
 
-                except Exception, e:
+            except Exception, e:
 
-                    sys.exit("Error plotting files: %s" % e)
+                sys.exit("Error plotting files: %s" % e)
                 
+#----------------------------------------------------------------------
+
+    def FollowFiles(self, file_list):
+        """
+        Plots the data written so far to files that are still being
+        written by a running simulation.  OnFollow then adds the lines
+        appended to the files to the plot.
+        """
+        self.followed = []
+
+        self.follow_lines = []
+
+        for f in file_list:
+
+            this_file = os.path.abspath(f)
+
+            if os.path.isfile(this_file):
+
+                self.followed.append(ascdata.FollowedFile(this_file))
+
+                self.follow_lines.append(None)
+
             else:
 
                 print "File Error: '%s' is not found." % this_file
-                
+
+        self._SetupAxes()
+
+        self._UpdateFollowed()
+
 #----------------------------------------------------------------------
 
-    def _PlotFile(self, f):
+    def _UpdateFollowed(self):
         """
-        Parses the data in file f and plots all data columns
+        Reads the new lines of the followed files.  The lines of a file
+        are plotted when it is first read, or read again from the start.
+        The points appended to a file that is already plotted are added to
+        its lines, and returned as short Line2D segments that OnFollow
+        draws on the canvas without redrawing the plot.  Returns the list
+        of segments, and True if the whole plot must be redrawn.
+
+        """
+        segments = []
+
+        redraw = False
+
+        for indx, followed in enumerate(self.followed):
+
+            if not followed.update():
+
+                continue
+
+            plot_data = followed.data().T
+
+            t = plot_data[0]
+
+            lines = self.follow_lines[indx]
+
+            if lines is not None and followed.first_new == 0:
+
+                # the file is being written again by a new run
+                for line in lines:
+
+                    line.remove()
+
+                lines = None
+
+                self.axes.relim()
+
+            if lines is None:
+
+                if self.verbose:
+
+                    print "Following file: %s" % followed.filename
+
+                if self.formt is None:
+
+                    lines = [self.axes.plot(t, x)[0] for x in plot_data[1:]]
+
+                else:
+
+                    lines = [self.axes.plot(t, x, self.formt)[0]
+                             for x in plot_data[1:]]
+
+                self.follow_lines[indx] = lines
+
+                redraw = True
+
+                continue
+
+            # the new points, joined to the last point already plotted
+            new_data = plot_data[:, followed.first_new - 1:]
+
+            for line, x, new_x in zip(lines, plot_data[1:], new_data[1:]):
+
+                segment = Line2D(new_data[0], new_x)
+
+                segment.update_from(line)
+
+                self.axes.add_line(segment)
+
+                segments.append(segment)
+
+                # views of the file data, which are only copied when
+                # the plot is redrawn
+                line.set_data(t, x)
+
+        if self._GrowLimits():
+
+            redraw = True
+
+        return segments, redraw
+
+#----------------------------------------------------------------------
+
+    def _GrowLimits(self):
+        """
+        If the followed data has grown out of an autoscaled axis, sets
+        its limits with room to spare: the X range is doubled, and the Y
+        range padded by a quarter on each side, so that a growing run is
+        redrawn only a few times.  Returns True if the limits changed.
+
+        """
+        x0, y0, x1, y1 = self.axes.dataLim.extents
+
+        if not np.all(np.isfinite([x0, y0, x1, y1])):
+
+            return False
+
+        grown = False
+
+        xmin, xmax = self.axes.get_xlim()
+
+        if self.axes.get_autoscalex_on() and (x0 < xmin or x1 > xmax):
+
+            self.axes.set_xlim(x0, x0 + 2*(x1 - x0 or 1.0), auto=None)
+
+            grown = True
+
+        ymin, ymax = self.axes.get_ylim()
+
+        if self.axes.get_autoscaley_on() and (y0 < ymin or y1 > ymax):
+
+            pad = 0.25*(y1 - y0 or 1.0)
+
+            self.axes.set_ylim(y0 - pad, y1 + pad, auto=None)
+
+            grown = True
+
+        return grown
+
+#----------------------------------------------------------------------
+
+    def OnFollow(self, event):
+
+        segments, redraw = self._UpdateFollowed()
+
+        if redraw or self.figure._cachedRenderer is None:
+
+            self.canvas.draw_idle()
+
+        elif segments:
+
+            # draw only the new points over the last drawing
+            for segment in segments:
+
+                self.axes.draw_artist(segment)
+
+            self.canvas.blit(self.axes.bbox)
+
+        # the lines of the files now hold the points of the segments
+        for segment in segments:
+
+            segment.remove()
+
+#----------------------------------------------------------------------
+
+    def _PlotFile(self, f, data=None):
+        """
+        Parses the data in file f and plots all data columns.
+        If the data has already been loaded, it is given as data.
 
         """
         
-        # Will end up being a list of lists. First item
-        # of the list will be the time step, all following
-        # items will be output data at each time step.
+        # Will end up being an array with a row for each column
+        # of the file. The first row will be the time step, all
+        # following rows will be output data at each time step.
         plot_data = None
         
         if self.verbose:
@@ -201,34 +409,26 @@ class G3Plot(wx.Frame):
 
         if os.path.isfile(this_file):
 
-            num_items = None
-            
-            fdata = open(this_file, 'r')
+            if data is None:
 
-            for line in fdata.readlines():
-                
-                data = line.split()
+                data = ascdata.load_columns(this_file)
 
-                if plot_data is None:
-                    
-                    num_items = len(data)
+            plot_data = data.T
 
-                    plot_data = [[] for i in range(num_items)]
+            # Now we plot all of the data we collected.
+            t = plot_data[0]
 
-                for indx, d in enumerate(data):
+            num_plots = len(plot_data[1:])
 
-                    if indx < num_items:
-                        
-                        try:
-                        
-                            plot_data[indx].append(d)
+            if num_plots > 1 and (self.formt is None or is_color_like(self.formt)):
 
-                        except IndexError, e:
+                if self.verbose:
 
-                            print "Error processing data line for index %d" % indx
+                    print "\tPlotting %d data sets together" % num_plots
 
-            # Now we plot all of the data we collected.
-            t = plot_data[0]
+                self._AddCollection(t, plot_data[1:])
+
+                return
 
             for indx, x in enumerate(plot_data[1:]):
 
@@ -256,6 +456,53 @@ class G3Plot(wx.Frame):
        
         """
         
+        self._SetupAxes()
+
+        # With the new, or an exising Axes instance, plot the data          
+        if self.formt is None:
+            self.axes.plot(t, x)
+        else:
+            self.axes.plot(t, x, self.formt)
+
+#----------------------------------------------------------------------
+
+    def _AddCollection(self, t, xs):
+        """
+        Plot the rows of the 2-D array xs against t as a single
+        LineCollection, which draws hundreds of traces much faster than
+        a Line2D for each one.  The colors are taken from the format,
+        or cycle as they would with separate plots.  Long traces are
+        drawn as their min/max envelope at the current zoom.
+
+        """
+
+        self._SetupAxes()
+
+        if self.formt is None:
+
+            colors = matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
+
+            offset = self.num_traces % len(colors)
+
+            colors = colors[offset:] + colors[:offset]
+
+        else:
+
+            colors = [self.formt]
+
+        envelope.collection_envelope(self.axes, t, xs, colors=colors)
+
+        self.num_traces += len(xs)
+
+#----------------------------------------------------------------------
+
+    def _SetupAxes(self):
+        """
+        Create the Axes if it doesn't exist, and set its autoscaling or
+        limits from the axis range options.
+
+        """
+
         if self.axes is None:
             self.axes = self.figure.add_subplot(1,1,1)
             # This is where Axes attributes are set
@@ -275,12 +522,6 @@ class G3Plot(wx.Frame):
             self.axes.set_autoscaley_on(False)
             self.axes.axis(ymin=self.ymin,ymax=self.ymax)
 
-        # With the new, or an exising Axes instance, plot the data          
-        if self.formt is None:
-            self.axes.plot(t, x)
-        else:
-            self.axes.plot(t, x, self.formt)
-
 #----------------------------------------------------------------------
 
 
@@ -322,6 +563,13 @@ file names are accepted.
         parser.add_option("-V", "--show-version", action="store_true", dest="version_flag",
             default = False, help="print the program version")
 
+        parser.add_option("-j", "--jobs", dest="jobs", type="int",
+            default=1, help="number of processes for reading files (default 1)")
+
+        parser.add_option("-F", "--follow", dest="follow", type="float",
+            default=None, metavar="SECONDS",
+            help="follow files still being written, reading new lines every SECONDS")
+
         parser.add_option("-t", "--title", dest="title", type="string",
             default=title,  help="Title for the graph")
 
@@ -349,6 +597,9 @@ file names are accepted.
         parser.add_option_group(rangegroup)
         (options, args) = parser.parse_args()
 
+        if options.follow is not None and options.follow < 0.01:
+            parser.error("The follow interval must be at least 0.01 seconds")
+
         if options.version_flag is True:
             parser.print_version()
             return True
@@ -374,6 +625,8 @@ file names are accepted.
         # Now make the plot
         frame = G3Plot(files=filenames,
             verbose=verbose,
+            jobs=max(1, options.jobs),
+            follow=options.follow,
             xlabel=xlabel,
             ylabel=ylabel,
             title=title,
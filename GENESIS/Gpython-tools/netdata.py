@@ -0,0 +1,1191 @@
+#!/usr/bin/env python
+
+# netdata - functions for reading the network data files that are viewed
+# with netview.py and netview-I.py.  These are produced by the GENESIS
+# asc_file objects created in the do_network_out function of ACnet2-batch.g,
+# with one line for each output time step, containing the value of soma Vm
+# (or synaptic current Ik) for each cell in the network.  The file may be
+# plain text, or text compressed with bzip2, and normally begins with a
+# header line of the form:
+#
+#   #optional_RUNID_string Ntimes start_time dt NX NY SEP_X SEP_Y x0 y0 z0
+#
+# When ACnet2-batch.g is run with binary_file = 1, the disk_out objects
+# write the same data to a '.dat' file in the GENESIS FMT1 binary format,
+# which is also read here.
+
+import os
+import bz2
+import bisect
+import struct
+import tempfile
+import itertools
+
+import numpy as np
+import matplotlib.colors
+
+# Default number of frames (output time steps) parsed at a time
+BLOCK_FRAMES = 256
+
+class LoadCancelled(Exception):
+    '''
+    Raised by a progress function to stop loading a data file.  The
+    functions below that take a progress argument call it after each block
+    of frames as progress(frames, nread, nbytes, sketch), where frames is
+    the array being filled, nread the number of frames in it so far, nbytes
+    the number of bytes of the file read, and sketch the RangeSketch of the
+    values read.
+    '''
+    pass
+
+def open_data_file(filename):
+    '''
+    Return an open file object for filename, which may be compressed with
+    bzip2 or be plain text.  The BZ2File constructor does not check the
+    format, so the first line is read to find out, and the file is then
+    rewound.
+    '''
+    fp = bz2.BZ2File(filename)
+    try:
+        fp.readline()
+        fp.seek(0)
+    except IOError:
+        # then assume plain text
+        fp.close()
+        fp = open(filename)
+    return fp
+
+def parse_header(line):
+    '''
+    Parse a netview header line and return a dictionary with the values
+    of Ntimes, t_min, dt, NX and NY, and the RUNID string (which may be
+    empty), or None if line is not a header.
+    '''
+    header = line.split()
+    if len(header) < 6 or header[0][0] != "#":
+        return None
+    return {'Ntimes': int(header[1]), 't_min': float(header[2]),
+        'dt': float(header[3]), 'NX': int(header[4]), 'NY': int(header[5]),
+        'RUNID': header[0][1:]}
+
+def read_header(filename):
+    '''
+    Return the parsed header of filename, or None if it has no header.
+    For a FMT1 binary file, None is returned if the network dimensions
+    can't be found from the cell positions in the file.
+    '''
+    if is_fmt1(filename):
+        info = read_fmt1_header(filename)
+        if info['NX'] is None:
+            return None
+        return info
+    fp = open_data_file(filename)
+    line = fp.readline()
+    fp.close()
+    return parse_header(line)
+
+def add_data_file_options(parser):
+    '''
+    Add the options of the command line tools for reading a data file to
+    the OptionParser parser: --no-cache, and the data file parameters used
+    when the file has no header line, which are found by data_file_params.
+    '''
+    parser.add_option("--no-cache", dest="cache", action="store_false",
+        default=True, help="don't write a frame cache; read a bz2 file "
+        "through its block index")
+    group = parser.add_option_group("Data File Parameters",
+        "Used when the data file has no header line")
+    group.add_option("--Ntimes", dest="Ntimes", type="int", default=2501,
+        help="number of entries (default 2501)")
+    group.add_option("--start", dest="t_min", type="float", default=0.0,
+        help="start time (default 0.0)")
+    group.add_option("--dt", dest="dt", type="float", default=0.0002,
+        help="output time step (default 0.0002)")
+    group.add_option("--NX", dest="NX", type="int", default=32,
+        help="number of cells on x-axis (default 32)")
+    group.add_option("--NY", dest="NY", type="int", default=32,
+        help="number of cells on y-axis (default 32)")
+
+def data_file_params(filename, options):
+    '''
+    Return the parsed header of filename, or if it has none, the values
+    of Ntimes, t_min, dt, NX and NY from the options added to a parser by
+    add_data_file_options.
+    '''
+    params = read_header(filename)
+    if params is None:
+        params = {'Ntimes': options.Ntimes, 't_min': options.t_min,
+            'dt': options.dt, 'NX': options.NX, 'NY': options.NY}
+    return params
+
+def iter_frame_blocks(fp, ncells, block_frames=BLOCK_FRAMES):
+    '''
+    Generator that parses the open data file fp in blocks of up to
+    block_frames lines, and yields each block as a (nframes, ncells)
+    float array, with the number of bytes of text it was parsed from.  A
+    header line at the start of the file is skipped, and an incomplete last
+    frame is dropped.  The lines of a block are joined and converted with a
+    single call to np.fromstring, so that no more than one block of text
+    and values is held in memory at a time.
+    '''
+    first = True
+    while True:
+        lines = list(itertools.islice(fp, block_frames))
+        if first:
+            first = False
+            if lines and lines[0].lstrip().startswith('#'):
+                lines = lines[1:] + list(itertools.islice(fp, 1))
+        if not lines:
+            return
+        text = ''.join(lines)
+        values = np.fromstring(text, sep=' ')
+        nframes = values.size // ncells
+        if nframes == 0:
+            return
+        yield values[:nframes*ncells].reshape(nframes, ncells), len(text)
+
+def _fill_frames(filename, frames, block_frames=BLOCK_FRAMES, progress=None):
+    '''
+    Fill the preallocated (Ntimes, NY, NX) array frames from filename a
+    block at a time, and return the number of frames read and a
+    RangeSketch of their values.
+    '''
+    Ntimes = len(frames)
+    flat = frames.reshape(Ntimes, -1)
+    sketch = RangeSketch()
+    nread = 0
+    nbytes = 0
+    fp = open_data_file(filename)
+    try:
+        for block, size in iter_frame_blocks(fp, flat.shape[1], block_frames):
+            n = min(len(block), Ntimes - nread)
+            flat[nread:nread + n] = block[:n]
+            sketch.add(block[:n])
+            nread += n
+            nbytes += size
+            if progress is not None:
+                progress(frames, nread, nbytes, sketch)
+            if nread == Ntimes:
+                break
+    finally:
+        fp.close()
+    return nread, sketch
+
+def load_frames(filename, Ntimes, NX, NY, dtype=np.float32,
+                block_frames=BLOCK_FRAMES, progress=None):
+    '''
+    Read up to Ntimes frames of network data from filename into a
+    preallocated (Ntimes, NY, NX) array, filled in place one block at a
+    time.  Note the difference between NumPy [row, col] order and the
+    network x-y grid (x, y) = (col, row): the AxesImage used for display
+    expects a NY x NX array for each frame.  If the file is shorter than
+    Ntimes, the returned array is truncated to the frames actually read.
+    '''
+    data = np.empty((Ntimes, NY, NX), dtype=dtype)
+    nread = _fill_frames(filename, data, block_frames, progress)[0]
+    if nread < Ntimes:
+        data = data[:nread]
+    return data
+
+#  ---------------------------------------------------------------
+#   Streaming statistics of the data values
+#  ---------------------------------------------------------------
+
+# Number of histogram bins in a RangeSketch
+SKETCH_BINS = 4096
+# Number of float64 values in a saved RangeSketch
+SKETCH_SIZE = SKETCH_BINS + 5
+
+class RangeSketch(object):
+    '''
+    RangeSketch keeps the range and a histogram of the data values as the
+    blocks of frames are loaded, so that percentiles can be used for the
+    color scale without a second pass over the data.  The bins cover a
+    range that starts with the values of the first block, and is doubled
+    (merging pairs of bins) whenever a block has values outside it, so the
+    error of a percentile is at most one bin width.
+    '''
+    def __init__(self, nbins=SKETCH_BINS):
+        self.counts = np.zeros(nbins, dtype=np.int64)
+        self.lo = 0.0
+        self.width = 0.0
+        self.vmin = np.inf
+        self.vmax = -np.inf
+
+    def add(self, values):
+        ''' Add an array of values to the sketch, ignoring NaN and inf '''
+        values = np.asarray(values).ravel()
+        if values.size == 0:
+            return
+        vmin, vmax = values.min(), values.max()
+        if not (np.isfinite(vmin) and np.isfinite(vmax)):
+            values = values[np.isfinite(values)]
+            if values.size == 0:
+                return
+            vmin, vmax = values.min(), values.max()
+        vmin, vmax = float(vmin), float(vmax)
+        nbins = len(self.counts)
+        if self.width == 0.0:
+            self.lo = vmin
+            self.width = max(vmax - vmin, abs(vmin)*1e-6, 1e-30)/nbins
+        while vmin < self.lo:
+            self._grow(left=True)
+        while vmax > self.lo + nbins*self.width:
+            self._grow(left=False)
+        index = ((values - self.lo)/self.width).astype(np.intp)
+        np.clip(index, 0, nbins - 1, out=index)
+        self.counts += np.bincount(index, minlength=nbins)
+        self.vmin = min(self.vmin, vmin)
+        self.vmax = max(self.vmax, vmax)
+
+    def _grow(self, left):
+        ''' Double the bin width, extending the range to the left or right '''
+        nbins = len(self.counts)
+        merged = self.counts.reshape(-1, 2).sum(axis=1)
+        self.counts = np.zeros(nbins, dtype=np.int64)
+        if left:
+            self.counts[nbins//2:] = merged
+            self.lo -= nbins*self.width
+        else:
+            self.counts[:nbins//2] = merged
+        self.width *= 2
+
+    def count(self):
+        return int(self.counts.sum())
+
+    def percentile(self, q):
+        '''
+        Return an estimate of the q'th percentile (0 - 100) of the values,
+        interpolated within the bin that holds it.
+        '''
+        n = self.count()
+        if n == 0:
+            return np.nan
+        if q <= 0:
+            return self.vmin
+        if q >= 100:
+            return self.vmax
+        cum = np.cumsum(self.counts)
+        target = q/100.0*n
+        i = int(np.searchsorted(cum, target))
+        below = cum[i] - self.counts[i]
+        value = self.lo + (i + (target - below)/self.counts[i])*self.width
+        return float(min(max(value, self.vmin), self.vmax))
+
+    def limits(self, qmin, qmax):
+        ''' Return the (qmin, qmax) percentiles, for use as color limits '''
+        return self.percentile(qmin), self.percentile(qmax)
+
+    def to_array(self):
+        ''' Return the sketch as an array of SKETCH_SIZE float64 values '''
+        return np.concatenate(([len(self.counts), self.lo, self.width,
+            self.vmin, self.vmax], self.counts)).astype(np.float64)
+
+    @classmethod
+    def from_array(cls, values):
+        ''' Return a RangeSketch from an array made by to_array '''
+        sketch = cls(int(values[0]))
+        sketch.lo, sketch.width, sketch.vmin, sketch.vmax = [float(v)
+            for v in values[1:5]]
+        sketch.counts[:] = values[5:]
+        return sketch
+
+#  ---------------------------------------------------------------
+#   Binary frame cache written next to the data file
+#  ---------------------------------------------------------------
+
+# The cache file begins with a fixed size header and the RangeSketch of the
+# data values, followed by the raw float32 frames in (Ntimes, NY, NX) order.
+# The size and modification time of the source file are saved, so that the
+# cache is rebuilt if it changes.
+CACHE_SUFFIX = '.cache'
+CACHE_MAGIC = 'NVCACHE2'
+CACHE_HEADER_SIZE = 128
+CACHE_DATA_OFFSET = CACHE_HEADER_SIZE + 8*SKETCH_SIZE
+_cache_header = struct.Struct('<8sqddiiddqd')
+_cache_fields = ('Ntimes', 't_min', 'dt', 'NX', 'NY', 'Vmin', 'Vmax',
+    'src_size', 'src_mtime')
+
+def cache_filename(filename):
+    return filename + CACHE_SUFFIX
+
+def read_cache_header(cachefile):
+    ''' Return the header of cachefile as a dictionary, or None if invalid '''
+    try:
+        fp = open(cachefile, 'rb')
+        try:
+            buf = fp.read(_cache_header.size)
+            fp.seek(CACHE_HEADER_SIZE)
+            sketch = np.fromfile(fp, dtype=np.float64, count=SKETCH_SIZE)
+        finally:
+            fp.close()
+    except IOError:
+        return None
+    if len(buf) < _cache_header.size or len(sketch) < SKETCH_SIZE:
+        return None
+    values = _cache_header.unpack(buf)
+    if values[0] != CACHE_MAGIC.encode('ascii'):
+        return None
+    info = dict(zip(_cache_fields, values[1:]))
+    info['sketch'] = RangeSketch.from_array(sketch)
+    return info
+
+def _write_cache_header(fp, info):
+    fp.seek(0)
+    header = _cache_header.pack(CACHE_MAGIC.encode('ascii'),
+        *[info[name] for name in _cache_fields])
+    fp.write(header.ljust(CACHE_HEADER_SIZE, b'\0'))
+    info['sketch'].to_array().tofile(fp)
+
+def cache_is_current(filename, info, NX, NY):
+    '''
+    Check that the cache header info matches the present size and
+    modification time of filename and the network dimensions.
+    '''
+    if info is None:
+        return False
+    st = os.stat(filename)
+    return (info['src_size'] == st.st_size and
+        info['src_mtime'] == st.st_mtime and
+        info['NX'] == NX and info['NY'] == NY)
+
+def open_cached_frames(cachefile, info):
+    ''' Return a read-only memory map of the frames in cachefile '''
+    shape = (info['Ntimes'], info['NY'], info['NX'])
+    return np.memmap(cachefile, dtype=np.float32, mode='r',
+        offset=CACHE_DATA_OFFSET, shape=shape)
+
+def build_cache(filename, Ntimes, t_min, dt, NX, NY,
+                block_frames=BLOCK_FRAMES, progress=None):
+    '''
+    Parse filename one block at a time directly into a new memory mapped
+    cache file, keeping a RangeSketch of the data values, and return the
+    cache header info.  The cache is written to a temporary file that replaces
+    any old cache when it is complete, and is removed if there is an error
+    or the load is cancelled.
+    '''
+    cachefile = cache_filename(filename)
+    tmpfile = cachefile + '.tmp'
+    st = os.stat(filename)
+    info = {'Ntimes': Ntimes, 't_min': t_min, 'dt': dt, 'NX': NX, 'NY': NY,
+        'Vmin': 0.0, 'Vmax': 0.0, 'src_size': st.st_size,
+        'src_mtime': st.st_mtime, 'sketch': RangeSketch()}
+    fp = open(tmpfile, 'wb')
+    _write_cache_header(fp, info)
+    fp.close()
+    try:
+        frames = np.memmap(tmpfile, dtype=np.float32, mode='r+',
+            offset=CACHE_DATA_OFFSET, shape=(Ntimes, NY, NX))
+        try:
+            nread, sketch = _fill_frames(filename, frames, block_frames,
+                progress)
+            frames.flush()
+        finally:
+            del frames
+        if nread == 0:
+            raise ValueError('No data frames found in ' + filename)
+    except:
+        os.remove(tmpfile)
+        raise
+    info.update(Ntimes=nread, Vmin=sketch.vmin, Vmax=sketch.vmax,
+        sketch=sketch)
+    fp = open(tmpfile, 'r+b')
+    _write_cache_header(fp, info)
+    fp.truncate(CACHE_DATA_OFFSET + nread*NX*NY*4)
+    fp.close()
+    if os.path.exists(cachefile):
+        os.remove(cachefile)
+    os.rename(tmpfile, cachefile)
+    return info
+
+def load_cached_frames(filename, Ntimes, t_min, dt, NX, NY, progress=None):
+    '''
+    Return (data, info) for filename, where data is a (Ntimes, NY, NX)
+    array of frames and info is a dictionary with the values of Ntimes,
+    t_min, dt, NX, NY, the data range Vmin, Vmax, and the RangeSketch of
+    the data values.  The first time a
+    file is loaded, it is parsed into a binary cache file next to it, and
+    later loads memory map the cache, unless the file has changed, with a
+    single call to progress for all of the frames.  If the cache can't be
+    written, the frames of a bzip2 file are read through its block index,
+    and those of a plain text file are read into memory.
+    '''
+    cachefile = cache_filename(filename)
+    info = read_cache_header(cachefile)
+    if not cache_is_current(filename, info, NX, NY):
+        try:
+            info = build_cache(filename, Ntimes, t_min, dt, NX, NY,
+                progress=progress)
+        except (IOError, OSError), e:
+            print 'Frame cache not written: ', e
+            if is_bz2(filename):
+                return load_indexed_frames(filename, Ntimes, t_min, dt,
+                    NX, NY, progress)
+            data = np.empty((Ntimes, NY, NX), dtype=np.float32)
+            nread, sketch = _fill_frames(filename, data, progress=progress)
+            info = {'Ntimes': nread, 't_min': t_min, 'dt': dt,
+                'NX': NX, 'NY': NY, 'Vmin': sketch.vmin, 'Vmax': sketch.vmax,
+                'sketch': sketch}
+            return data[:nread], info
+        return open_cached_frames(cachefile, info), info
+    data = open_cached_frames(cachefile, info)
+    if progress is not None:
+        progress(data, info['Ntimes'], info['src_size'], info['sketch'])
+    return data, info
+
+#  ---------------------------------------------------------------
+#   Block index for random access to bzip2 compressed files
+#  ---------------------------------------------------------------
+
+# A bzip2 file is a sequence of independently compressed blocks of about
+# 900 kB of text, each beginning with a 48 bit magic number at an arbitrary
+# bit position in the file.  The index records the bit range of each block
+# and the number of lines before it in the text, so that a frame can be
+# found and decoded from its block without decompressing the file from the
+# start.  It is written next to the data file, and holds the RangeSketch of
+# the data, so that a large compressed run can be viewed without a frame
+# cache.
+INDEX_SUFFIX = '.bz2idx'
+INDEX_MAGIC = 'NVBZIDX2'
+_index_header = struct.Struct('<8sqiiiqddqd')
+_index_fields = ('Ntimes', 'NX', 'NY', 'header_lines', 'nblocks',
+    'Vmin', 'Vmax', 'src_size', 'src_mtime')
+_BZ2_BLOCK_MAGIC = b'\x31\x41\x59\x26\x53\x59'
+_BZ2_EOS_MAGIC = b'\x17\x72\x45\x38\x50\x90'
+
+def index_filename(filename):
+    return filename + INDEX_SUFFIX
+
+def is_bz2(filename):
+    ''' Check if filename is compressed with bzip2 '''
+    fp = open(filename, 'rb')
+    label = fp.read(3)
+    fp.close()
+    return label == b'BZh'
+
+def _find_bz2_markers(filename, chunk_size=1 << 24):
+    '''
+    Return sorted lists of the bit offsets of the block and end of stream
+    magic numbers in a bzip2 file.  The file is read in chunks, and each
+    chunk is searched at the eight possible bit shifts.  A chunk overlaps
+    the end of the one before, and the offsets are collected in sets so
+    that a marker in the overlap is only counted once.
+    '''
+    blocks = set()
+    markers = set()
+    fp = open(filename, 'rb')
+    try:
+        pos = 0
+        tail = b''
+        while True:
+            buf = fp.read(chunk_size)
+            if not buf:
+                break
+            data = tail + buf
+            base = pos - len(tail)
+            raw = np.frombuffer(data, dtype=np.uint8).astype(np.uint16)
+            for shift in range(8):
+                shifted = ((raw[:-1] << shift) |
+                    (raw[1:] >> (8 - shift))).astype(np.uint8).tobytes()
+                for magic in (_BZ2_BLOCK_MAGIC, _BZ2_EOS_MAGIC):
+                    i = shifted.find(magic)
+                    while i >= 0:
+                        bit = 8*(base + i) + shift
+                        markers.add(bit)
+                        if magic == _BZ2_BLOCK_MAGIC:
+                            blocks.add(bit)
+                        i = shifted.find(magic, i + 1)
+            tail = data[-7:]
+            pos += len(buf)
+    finally:
+        fp.close()
+    return sorted(blocks), sorted(markers)
+
+def _read_bz2_block(fp, start, end):
+    '''
+    Decompress the bzip2 block in the bit range start - end of the open
+    file fp.  The bits are shifted to a byte boundary and made into a
+    stream of one block, with a stream header and an end of stream marker
+    whose combined CRC is the block CRC that follows the block magic.  An
+    IOError or ValueError is raised if the range is not a whole block.
+    '''
+    fp.seek(start//8)
+    raw = np.frombuffer(fp.read((end + 7)//8 - start//8), dtype=np.uint8)
+    bits = np.unpackbits(raw)[start % 8:start % 8 + end - start]
+    eos = np.unpackbits(np.frombuffer(_BZ2_EOS_MAGIC, dtype=np.uint8))
+    stream = np.concatenate((bits, eos, bits[48:80]))
+    return bz2.decompress(b'BZh9' + np.packbits(stream).tobytes())
+
+class Bz2Frames(object):
+    '''
+    Bz2Frames gives read-only access to the frames of a bzip2 compressed
+    text file through its block index, and is used in place of a frame
+    array.  Indexing with a frame number or a slice of frames decodes only
+    the blocks containing those lines, and the text of the last few blocks
+    used is kept, so that playing forward decodes each block once.
+    '''
+    max_blocks = 8
+
+    def __init__(self, filename, info, blocks=()):
+        self.filename = filename
+        self.info = info
+        self.dtype = np.dtype(np.float32)
+        self.ndim = 3
+        self.starts = [int(b[0]) for b in blocks]
+        self.ends = [int(b[1]) for b in blocks]
+        self.lines = [int(b[2]) for b in blocks]
+        self._text = {}
+        self._used = []
+
+    @property
+    def shape(self):
+        return (self.info['Ntimes'], self.info['NY'], self.info['NX'])
+
+    def __len__(self):
+        return self.info['Ntimes']
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            return self.read(start, max(stop - start, 0))[::step]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('frame %d out of range' % key)
+        return self.read(key, 1)[0]
+
+    def add_block(self, start, end, lines):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(lines)
+
+    def blocks(self):
+        ''' Return the index as a (nblocks, 3) array of start, end, lines '''
+        return np.array([self.starts, self.ends, self.lines],
+            dtype=np.int64).T.reshape(-1, 3)
+
+    def block_text(self, k):
+        if k not in self._text:
+            fp = open(self.filename, 'rb')
+            try:
+                self._text[k] = _read_bz2_block(fp, self.starts[k],
+                    self.ends[k])
+            finally:
+                fp.close()
+            self._used.append(k)
+            if len(self._used) > self.max_blocks:
+                del self._text[self._used.pop(0)]
+        return self._text[k]
+
+    def read(self, first, nframes):
+        '''
+        Return an array of nframes frames starting with frame first.  The
+        line of the first frame is found from the number of lines before
+        each block, and the following blocks are added until the text
+        holds all of the frames.
+        '''
+        NX, NY = self.info['NX'], self.info['NY']
+        nframes = max(0, min(nframes, len(self) - first))
+        if nframes == 0:
+            return np.empty((0, NY, NX), dtype=self.dtype)
+        line = first + self.info['header_lines']
+        k = max(bisect.bisect_left(self.lines, line) - 1, 0)
+        text = self.block_text(k)
+        pos = 0
+        for i in range(line - self.lines[k]):
+            pos = text.index('\n', pos) + 1
+        parts = [text[pos:]]
+        count = parts[0].count('\n')
+        while count < nframes and k + 1 < len(self.starts):
+            k += 1
+            parts.append(self.block_text(k))
+            count += parts[-1].count('\n')
+        lines = ''.join(parts).split('\n', nframes)[:nframes]
+        values = np.fromstring('\n'.join(lines), dtype=self.dtype, sep=' ')
+        return values[:nframes*NX*NY].reshape(-1, NY, NX)
+
+def build_bz2_index(filename, NX, NY, progress=None):
+    '''
+    Decompress a bzip2 file block by block, and return a Bz2Frames object
+    for it with the block index, and its info.  The text of each block is
+    parsed to count the frames and add their values to a RangeSketch.  A
+    block magic number can occur by chance inside the compressed data, so
+    a block that is cut short by a false marker is extended to the next
+    ones, and one that still fails to decode is taken to be false.  The
+    frames object is passed to progress as it grows, so that playing can
+    start early.
+    '''
+    st = os.stat(filename)
+    info = {'Ntimes': 0, 'NX': NX, 'NY': NY, 'header_lines': 0,
+        'nblocks': 0, 'Vmin': 0.0, 'Vmax': 0.0, 'src_size': st.st_size,
+        'src_mtime': st.st_mtime, 'sketch': RangeSketch()}
+    frames = Bz2Frames(filename, info)
+    starts, markers = _find_bz2_markers(filename)
+    ncells = NX*NY
+    sketch = info['sketch']
+    nlines = nvalues = 0
+    carry = ''
+    first = True
+    fp = open(filename, 'rb')
+    try:
+        i = 0
+        while i < len(starts):
+            start = starts[i]
+            text = None
+            j = bisect.bisect_right(markers, start)
+            for end in markers[j:j + 4]:
+                try:
+                    text = _read_bz2_block(fp, start, end)
+                    break
+                except (IOError, ValueError, EOFError):
+                    pass
+            if text is None:
+                i += 1
+                continue
+            frames.add_block(start, end, nlines)
+            nlines += text.count('\n')
+            chunk = carry + text
+            cut = chunk.rfind('\n') + 1
+            chunk, carry = chunk[:cut], chunk[cut:]
+            if first and chunk:
+                first = False
+                if chunk.lstrip().startswith('#'):
+                    info['header_lines'] = 1
+                    chunk = chunk[chunk.index('\n') + 1:]
+            values = np.fromstring(chunk, sep=' ')
+            sketch.add(values)
+            nvalues += values.size
+            info['Ntimes'] = nvalues//ncells
+            if progress is not None:
+                progress(frames, len(frames), end//8, sketch)
+            i = bisect.bisect_left(starts, end)
+    finally:
+        fp.close()
+    if carry.strip():
+        values = np.fromstring(carry, sep=' ')
+        sketch.add(values)
+        nvalues += values.size
+        info['Ntimes'] = nvalues//ncells
+    if info['Ntimes'] == 0:
+        raise ValueError('No data frames found in ' + filename)
+    info.update(nblocks=len(frames.starts), Vmin=sketch.vmin,
+        Vmax=sketch.vmax)
+    return frames, info
+
+def read_bz2_index(indexfile):
+    ''' Return (info, blocks) from indexfile, or (None, None) if invalid '''
+    try:
+        fp = open(indexfile, 'rb')
+        try:
+            buf = fp.read(_index_header.size)
+            sketch = np.fromfile(fp, dtype=np.float64, count=SKETCH_SIZE)
+            blocks = np.fromfile(fp, dtype=np.int64)
+        finally:
+            fp.close()
+    except IOError:
+        return None, None
+    if len(buf) < _index_header.size or len(sketch) < SKETCH_SIZE:
+        return None, None
+    values = _index_header.unpack(buf)
+    if values[0] != INDEX_MAGIC.encode('ascii'):
+        return None, None
+    info = dict(zip(_index_fields, values[1:]))
+    if blocks.size != 3*info['nblocks']:
+        return None, None
+    info['sketch'] = RangeSketch.from_array(sketch)
+    return info, blocks.reshape(-1, 3)
+
+def write_bz2_index(indexfile, info, blocks):
+    fp = open(indexfile, 'wb')
+    try:
+        fp.write(_index_header.pack(INDEX_MAGIC.encode('ascii'),
+            *[info[name] for name in _index_fields]))
+        info['sketch'].to_array().tofile(fp)
+        blocks.astype(np.int64).tofile(fp)
+    finally:
+        fp.close()
+
+def load_indexed_frames(filename, Ntimes, t_min, dt, NX, NY, progress=None):
+    '''
+    Return (data, info) for a bzip2 compressed file, as with
+    load_cached_frames, where data is a Bz2Frames object that decodes
+    frames from their blocks when they are used.  The block index is read
+    from the index file if it is current, or made with build_bz2_index and
+    saved.  If the index can't be written, it is only kept in memory.
+    '''
+    indexfile = index_filename(filename)
+    info, blocks = read_bz2_index(indexfile)
+    current = cache_is_current(filename, info, NX, NY)
+    if current:
+        frames = Bz2Frames(filename, info, blocks)
+    else:
+        frames, info = build_bz2_index(filename, NX, NY, progress)
+        try:
+            write_bz2_index(indexfile, info, frames.blocks())
+        except (IOError, OSError), e:
+            print 'Frame index not written: ', e
+    info.update(Ntimes=min(Ntimes, info['Ntimes']), t_min=t_min, dt=dt)
+    if current and progress is not None:
+        # every frame can be decoded as soon as the index is read
+        progress(frames, info['Ntimes'], info['src_size'], info['sketch'])
+    return frames, info
+
+#  ---------------------------------------------------------------
+#   GENESIS disk_out FMT1 binary files
+#  ---------------------------------------------------------------
+
+# A FMT1 file begins with an 80 character label starting with "FMT1",
+# followed by the float start time and time step, the int number of data
+# values per step (ndata) and data type, and the float x, y, z positions
+# of the ndata sources.  The rest of the file is ndata values per step.
+FMT1_LABEL_SIZE = 80
+_fmt1_header = struct.Struct('=ffii')
+
+def is_fmt1(filename):
+    ''' Check if filename is a GENESIS FMT1 binary file '''
+    fp = open(filename, 'rb')
+    label = fp.read(4)
+    fp.close()
+    return label == b'FMT1'
+
+def _fmt1_grid(coords, ndata):
+    '''
+    Return (NX, NY) for a rectangular grid of ndata cells with the x, y, z
+    cell positions in coords, which may be stored as ndata (x, y, z)
+    triples or as separate x, y and z arrays, or (None, None) if the
+    positions don't form a grid.
+    '''
+    for xyz in (coords.reshape(ndata, 3).T, coords.reshape(3, ndata)):
+        NX = len(np.unique(xyz[0]))
+        NY = len(np.unique(xyz[1]))
+        if NX*NY == ndata and NX > 1 and NY > 1:
+            return NX, NY
+    return None, None
+
+def read_fmt1_header(filename):
+    '''
+    Read the header of a FMT1 file and return a dictionary with the values
+    of Ntimes, t_min, dt, NX, NY as for a text file header, and the data
+    offset and dtype needed to map the data.  Ntimes is found from the
+    file size.
+    '''
+    fp = open(filename, 'rb')
+    try:
+        fp.seek(FMT1_LABEL_SIZE)
+        t_min, dt, ndata, datatype = _fmt1_header.unpack(
+            fp.read(_fmt1_header.size))
+        coords = np.fromfile(fp, dtype=np.float32, count=3*ndata)
+    finally:
+        fp.close()
+    # datatype is the size of each value, normally 4 for float
+    dtype = np.dtype(np.float64 if datatype == 8 else np.float32)
+    offset = FMT1_LABEL_SIZE + _fmt1_header.size + 3*ndata*4
+    Ntimes = (os.path.getsize(filename) - offset)//(ndata*dtype.itemsize)
+    NX, NY = _fmt1_grid(coords, ndata)
+    return {'Ntimes': Ntimes, 't_min': float(t_min), 'dt': float(dt),
+        'NX': NX, 'NY': NY, 'ndata': ndata, 'offset': offset, 'dtype': dtype}
+
+def load_fmt1_frames(filename, Ntimes, NX, NY, block_frames=BLOCK_FRAMES,
+                     progress=None):
+    '''
+    Return (data, info) for a FMT1 file, as with load_cached_frames.  The
+    data values are memory mapped directly from the file without a copy,
+    so no cache file is needed, and only the RangeSketch of the values is
+    made by reading through the file a block at a time.
+    '''
+    info = read_fmt1_header(filename)
+    if NX*NY != info['ndata']:
+        raise ValueError('%s has %d values per step, not NX*NY = %d'
+            % (filename, info['ndata'], NX*NY))
+    Ntimes = min(Ntimes, info['Ntimes'])
+    data = np.memmap(filename, dtype=info['dtype'], mode='r',
+        offset=info['offset'], shape=(Ntimes, NY, NX))
+    sketch = RangeSketch()
+    frame_bytes = NX*NY*info['dtype'].itemsize
+    for i in range(0, Ntimes, block_frames):
+        block = data[i:i + block_frames]
+        sketch.add(block)
+        if progress is not None:
+            nread = i + len(block)
+            progress(data, nread, nread*frame_bytes, sketch)
+    info.update(Ntimes=Ntimes, NX=NX, NY=NY, Vmin=sketch.vmin,
+        Vmax=sketch.vmax, sketch=sketch)
+    return data, info
+
+def load_network_frames(filename, Ntimes, t_min, dt, NX, NY, progress=None,
+                        cache=True):
+    '''
+    Return (data, info) for a netview data file of any of the supported
+    types: a FMT1 binary file, or plain or bz2 compressed text.  With
+    cache = False, no frame cache is written, and a bz2 file is read
+    through its block index instead.
+    '''
+    if is_fmt1(filename):
+        return load_fmt1_frames(filename, Ntimes, NX, NY, progress=progress)
+    if not cache and is_bz2(filename):
+        return load_indexed_frames(filename, Ntimes, t_min, dt, NX, NY,
+            progress)
+    return load_cached_frames(filename, Ntimes, t_min, dt, NX, NY, progress)
+
+#  ---------------------------------------------------------------
+#   Time pyramid of decimated frames for fast playback
+#  ---------------------------------------------------------------
+
+# Level k of the pyramid has a mean frame and a peak frame for each block
+# of 2**k frames.  The peak is the value of each cell that is farthest from
+# the center (the median of all the data), so that it is the max-abs value
+# for EPSC data, and shows spikes and deep hyperpolarization in Vm data.
+# Both combine exactly from one level to the next.  The pyramid file holds
+# a fixed size header, then the mean and the peak frames of each level in
+# turn, from PYRAMID_MIN_LEVEL up to the level with a single block.
+PYRAMID_SUFFIX = '.pyramid'
+PYRAMID_MAGIC = 'NVPYRAM1'
+PYRAMID_HEADER_SIZE = 128
+PYRAMID_MIN_LEVEL = 2
+_pyramid_header = struct.Struct('<8sqiiiidqd')
+_pyramid_fields = ('Ntimes', 'NX', 'NY', 'min_level', 'max_level',
+    'center', 'src_size', 'src_mtime')
+
+def pyramid_filename(filename):
+    return filename + PYRAMID_SUFFIX
+
+def _pyramid_shapes(info):
+    ''' Return a list of (level, frame array shape) for each level '''
+    return [(k, (info['Ntimes'] >> k, info['NY'], info['NX']))
+        for k in range(info['min_level'], info['max_level'] + 1)]
+
+def read_pyramid_header(pyrfile):
+    ''' Return the header of pyrfile as a dictionary, or None if invalid '''
+    try:
+        fp = open(pyrfile, 'rb')
+        try:
+            buf = fp.read(_pyramid_header.size)
+        finally:
+            fp.close()
+    except IOError:
+        return None
+    if len(buf) < _pyramid_header.size:
+        return None
+    values = _pyramid_header.unpack(buf)
+    if values[0] != PYRAMID_MAGIC.encode('ascii'):
+        return None
+    return dict(zip(_pyramid_fields, values[1:]))
+
+def open_pyramid(pyrfile, info, mode='r'):
+    '''
+    Return a dictionary of the (mean, peak) pairs of memory mapped frame
+    arrays in pyrfile, with the level number as key.
+    '''
+    levels = {}
+    offset = PYRAMID_HEADER_SIZE
+    for k, shape in _pyramid_shapes(info):
+        nbytes = 4*shape[0]*shape[1]*shape[2]
+        levels[k] = tuple(np.memmap(pyrfile, dtype=np.float32, mode=mode,
+            offset=offset + i*nbytes, shape=shape) for i in (0, 1))
+        offset += 2*nbytes
+    return levels
+
+def _peak(a, b, center):
+    ''' Return the values of a or b that are farthest from center '''
+    return np.where(np.abs(b - center) > np.abs(a - center), b, a)
+
+def _fill_pyramid(data, levels, center, block_frames=BLOCK_FRAMES):
+    '''
+    Fill the (mean, peak) frame arrays of each level from the frames in
+    data.  The first level is reduced from data, and each level above it
+    from the one below, a block at a time, so that only the first level
+    reads all of the data.
+    '''
+    k0 = min(levels)
+    size = 1 << k0
+    mean, peak = levels[k0]
+    chunk = max(1, block_frames//size)
+    for i in range(0, len(mean), chunk):
+        n = min(chunk, len(mean) - i)
+        block = np.asarray(data[i*size:(i + n)*size], dtype=np.float32)
+        block = block.reshape((n, size) + block.shape[1:])
+        mean[i:i + n] = block.mean(axis=1)
+        p = block[:, 0]
+        for j in range(1, size):
+            p = _peak(p, block[:, j], center)
+        peak[i:i + n] = p
+    for k in range(k0 + 1, max(levels) + 1):
+        lmean, lpeak = levels[k - 1]
+        mean, peak = levels[k]
+        for i in range(0, len(mean), block_frames):
+            j = min(i + block_frames, len(mean))
+            mean[i:j] = 0.5*(lmean[2*i:2*j:2] + lmean[2*i + 1:2*j:2])
+            peak[i:j] = _peak(lpeak[2*i:2*j:2], lpeak[2*i + 1:2*j:2], center)
+
+def build_pyramid(filename, data, center, pyrfile=None):
+    '''
+    Make the time pyramid for the frames in data, which were loaded from
+    filename, and save it in pyrfile (by default next to filename).  It is
+    written to a temporary file that replaces any old one when complete.
+    Return the pyramid header info.
+    '''
+    if pyrfile is None:
+        pyrfile = pyramid_filename(filename)
+    Ntimes, NY, NX = data.shape
+    st = os.stat(filename)
+    info = {'Ntimes': Ntimes, 'NX': NX, 'NY': NY,
+        'min_level': PYRAMID_MIN_LEVEL, 'max_level': Ntimes.bit_length() - 1,
+        'center': center, 'src_size': st.st_size, 'src_mtime': st.st_mtime}
+    shapes = _pyramid_shapes(info)
+    size = PYRAMID_HEADER_SIZE + sum(8*n*ny*nx for k, (n, ny, nx) in shapes)
+    tmpfile = pyrfile + '.tmp'
+    fp = open(tmpfile, 'wb')
+    try:
+        header = _pyramid_header.pack(PYRAMID_MAGIC.encode('ascii'),
+            *[info[name] for name in _pyramid_fields])
+        fp.write(header.ljust(PYRAMID_HEADER_SIZE, b'\0'))
+        fp.truncate(size)
+    finally:
+        fp.close()
+    try:
+        levels = open_pyramid(tmpfile, info, mode='r+')
+        _fill_pyramid(data, levels, center)
+        for mean, peak in levels.values():
+            mean.flush()
+            peak.flush()
+        del levels
+    except:
+        os.remove(tmpfile)
+        raise
+    if os.path.exists(pyrfile):
+        os.remove(pyrfile)
+    os.rename(tmpfile, pyrfile)
+    return info
+
+def load_pyramid(filename, data, info):
+    '''
+    Return the time pyramid levels for the frames in data, loaded from
+    filename with the given info, as a dictionary of (mean, peak) pairs of
+    frame arrays with the level number as key.  The pyramid file is made
+    the first time, and memory mapped later on.  If it can't be written,
+    the pyramid is made in memory.  None is returned if there are too few
+    frames for a pyramid.
+    '''
+    if len(data) < 1 << PYRAMID_MIN_LEVEL:
+        return None
+    pyrfile = pyramid_filename(filename)
+    pinfo = read_pyramid_header(pyrfile)
+    if (pinfo is None or not cache_is_current(filename, pinfo,
+            info['NX'], info['NY']) or pinfo['Ntimes'] != len(data)):
+        center = info['sketch'].percentile(50)
+        try:
+            pinfo = build_pyramid(filename, data, center)
+        except (IOError, OSError), e:
+            print 'Time pyramid not written: ', e
+            Ntimes, NY, NX = data.shape
+            levels = {}
+            for k in range(PYRAMID_MIN_LEVEL, Ntimes.bit_length()):
+                levels[k] = (np.empty((Ntimes >> k, NY, NX), np.float32),
+                    np.empty((Ntimes >> k, NY, NX), np.float32))
+            _fill_pyramid(data, levels, center)
+            return levels
+    return open_pyramid(pyrfile, pinfo)
+
+def pyramid_level(levels, step):
+    '''
+    Return the pyramid level to use when playing every step'th frame, or
+    None to play the frames themselves when step is 1.  The level has
+    blocks of the smallest power of 2 frames not below step, so that the
+    frames shown fall in every block in turn, and none of the frames that
+    are skipped are missed.
+    '''
+    if levels is None or step <= 1:
+        return None
+    k = int(step - 1).bit_length()
+    return min(max(k, min(levels)), max(levels))
+
+#  ---------------------------------------------------------------
+#   Cell-major trace cache for per-cell time series
+#  ---------------------------------------------------------------
+
+# The frames are stored with the values of all cells for each time step
+# together, so reading the time series of one cell touches every page of
+# the data.  The trace cache holds the same values transposed, as a float32
+# (NX*NY, Ntimes) array after a fixed size header, so that the trace of
+# cell number y*NX + x is one contiguous read.
+TRACE_SUFFIX = '.traces'
+TRACE_MAGIC = 'NVTRACE1'
+TRACE_HEADER_SIZE = 128
+_trace_header = struct.Struct('<8sqiiqd')
+_trace_fields = ('Ntimes', 'NX', 'NY', 'src_size', 'src_mtime')
+# Number of values read from the frames at a time when transposing them
+TRACE_BLOCK_VALUES = 1 << 23
+
+def trace_filename(filename):
+    return filename + TRACE_SUFFIX
+
+def read_trace_header(tracefile):
+    ''' Return the header of tracefile as a dictionary, or None if invalid '''
+    try:
+        fp = open(tracefile, 'rb')
+        try:
+            buf = fp.read(_trace_header.size)
+        finally:
+            fp.close()
+    except IOError:
+        return None
+    if len(buf) < _trace_header.size:
+        return None
+    values = _trace_header.unpack(buf)
+    if values[0] != TRACE_MAGIC.encode('ascii'):
+        return None
+    return dict(zip(_trace_fields, values[1:]))
+
+def open_trace_cache(tracefile, info):
+    ''' Return a read-only (NX*NY, Ntimes) memory map of the traces '''
+    shape = (info['NX']*info['NY'], info['Ntimes'])
+    return np.memmap(tracefile, dtype=np.float32, mode='r',
+        offset=TRACE_HEADER_SIZE, shape=shape)
+
+def build_trace_cache(filename, data, progress=None):
+    '''
+    Write the trace cache of the (Ntimes, NY, NX) frames in data, which
+    were loaded from filename, and return its header info.  The frames are
+    read in blocks of about TRACE_BLOCK_VALUES values, and each block is
+    written to the part of every trace that it covers.  After each block,
+    progress(nframes) is called with the number of frames done, and it may
+    raise LoadCancelled to stop, which removes the unfinished file.
+    '''
+    tracefile = trace_filename(filename)
+    tmpfile = tracefile + '.tmp'
+    Ntimes, NY, NX = data.shape
+    st = os.stat(filename)
+    info = {'Ntimes': Ntimes, 'NX': NX, 'NY': NY, 'src_size': st.st_size,
+        'src_mtime': st.st_mtime}
+    fp = open(tmpfile, 'wb')
+    try:
+        header = _trace_header.pack(TRACE_MAGIC.encode('ascii'),
+            *[info[name] for name in _trace_fields])
+        fp.write(header.ljust(TRACE_HEADER_SIZE, b'\0'))
+        fp.truncate(TRACE_HEADER_SIZE + 4*NX*NY*Ntimes)
+    finally:
+        fp.close()
+    block_frames = max(1, TRACE_BLOCK_VALUES//(NX*NY))
+    try:
+        traces = np.memmap(tmpfile, dtype=np.float32, mode='r+',
+            offset=TRACE_HEADER_SIZE, shape=(NX*NY, Ntimes))
+        try:
+            for i in range(0, Ntimes, block_frames):
+                block = np.asarray(data[i:i + block_frames])
+                traces[:, i:i + len(block)] = block.reshape(len(block), -1).T
+                if progress is not None:
+                    progress(i + len(block))
+            traces.flush()
+        finally:
+            del traces
+    except:
+        os.remove(tmpfile)
+        raise
+    if os.path.exists(tracefile):
+        os.remove(tracefile)
+    os.rename(tmpfile, tracefile)
+    return info
+
+def load_trace_cache(filename, data, progress=None):
+    '''
+    Return a (NX*NY, Ntimes) array with the trace of each cell for the
+    frames in data, loaded from filename.  The trace cache file is made
+    the first time, and memory mapped later on.  If it can't be written,
+    None is returned, and the traces have to be read from the frames.
+    '''
+    tracefile = trace_filename(filename)
+    info = read_trace_header(tracefile)
+    Ntimes, NY, NX = data.shape
+    if (not cache_is_current(filename, info, NX, NY) or
+            info['Ntimes'] != Ntimes):
+        try:
+            info = build_trace_cache(filename, data, progress)
+        except (IOError, OSError), e:
+            print 'Trace cache not written: ', e
+            return None
+    return open_trace_cache(tracefile, info)
+
+#  ---------------------------------------------------------------
+#   Quantized frames for color lookup table display
+#  ---------------------------------------------------------------
+
+# Define a 'cold' to 'hot' color scale based in GENESIS 2 'hot'
+HOT_COLORS = ['#000032', '#00003c', '#000046',
+    '#000050', '#00005a', '#000064', '#00006e', '#000078', '#000082',
+    '#00008c', '#000096', '#0000a0', '#0000aa', '#0000b4', '#0000be',
+    '#0000c8', '#0000d2', '#0000dc', '#0000e6', '#0000f0', '#0000fa',
+    '#0000ff', '#000af6', '#0014ec', '#001ee2', '#0028d8', '#0032ce',
+    '#003cc4', '#0046ba', '#0050b0', '#005aa6', '#00649c', '#006e92',
+    '#007888', '#00827e', '#008c74', '#00966a', '#00a060', '#00aa56',
+    '#00b44c', '#00be42', '#00c838', '#00d22e', '#00dc24', '#00e61a',
+    '#00f010', '#00fa06', '#00ff00', '#0af600', '#14ec00', '#1ee200',
+    '#28d800', '#32ce00', '#3cc400', '#46ba00', '#50b000', '#5aa600',
+    '#649c00', '#6e9200', '#788800', '#827e00', '#8c7400', '#966a00',
+    '#a06000', '#aa5600', '#b44c00', '#be4200', '#c83800', '#d22e00',
+    '#dc2400', '#e61a00', '#f01000', '#fa0600', '#ff0000', '#ff0a00',
+    '#ff1400', '#ff1e00', '#ff2800', '#ff3200', '#ff3c00', '#ff4600',
+    '#ff5000', '#ff5a00', '#ff6400', '#ff6e00', '#ff7800', '#ff8200',
+    '#ff8c00', '#ff9600', '#ffa000', '#ffaa00', '#ffb400', '#ffbe00',
+    '#ffc800', '#ffd200', '#ffdc00', '#ffe600', '#fff000', '#fffa00',
+    '#ffff00', '#ffff0a', '#ffff14', '#ffff1e', '#ffff28', '#ffff32',
+    '#ffff3c', '#ffff46', '#ffff50', '#ffff5a', '#ffff64', '#ffff6e',
+    '#ffff78', '#ffff82', '#ffff8c', '#ffff96', '#ffffa0', '#ffffaa',
+    '#ffffb4', '#ffffbe', '#ffffc8', '#ffffd2', '#ffffdc', '#ffffe6',
+    '#fffff0']
+
+def hot_colormap():
+    ''' Return the GENESIS 2 'hot' color scale as a matplotlib colormap '''
+    return matplotlib.colors.ListedColormap(HOT_COLORS)
+
+def quantize_frames(data, Vmin, Vmax, ncolors, block_frames=BLOCK_FRAMES,
+        out=None, progress=None):
+    '''
+    Return a uint8 array of the same shape as data, with each value
+    replaced by the index of its color in a colormap with ncolors entries,
+    in the same way as the Normalize and ListedColormap used by imshow.
+    Values outside Vmin - Vmax get the first or last color.  The data is
+    converted a block of frames at a time to limit the temporary arrays,
+    into out if it is given.  progress is called with the number of frames
+    converted after each block, and may raise LoadCancelled to stop.
+    '''
+    qdata = out if out is not None else np.empty(data.shape, dtype=np.uint8)
+    scale = ncolors/(Vmax - Vmin) if Vmax > Vmin else 0.0
+    for i in range(0, len(data), block_frames):
+        block = (data[i:i + block_frames] - Vmin)*scale
+        np.clip(block, 0, ncolors - 1, out=block)
+        qdata[i:i + block_frames] = block
+        if progress is not None:
+            progress(i + len(block))
+    return qdata
+
+def quantize_levels(data, levels, Vmin, Vmax, ncolors, progress=None):
+    '''
+    Return (qdata, qlevels), the frames in data and the (mean, peak) frames
+    of the time pyramid levels (or None) converted by quantize_frames for
+    the color limits Vmin - Vmax.  qdata is kept in an unnamed temporary
+    file mapped into memory, so that the frames of a long run are paged
+    out rather than filling memory, or in memory if the file can't be
+    made.  progress is passed on to quantize_frames.
+    '''
+    try:
+        qdata = np.memmap(tempfile.TemporaryFile(), dtype=np.uint8,
+            mode='w+', shape=data.shape)
+    except (IOError, OSError), e:
+        print 'Quantized frames kept in memory: ', e
+        qdata = np.empty(data.shape, dtype=np.uint8)
+    quantize_frames(data, Vmin, Vmax, ncolors, out=qdata, progress=progress)
+    if levels is None:
+        return qdata, None
+    qlevels = {}
+    for k, (mean, peak) in levels.items():
+        qlevels[k] = (quantize_frames(mean, Vmin, Vmax, ncolors,
+            progress=progress), quantize_frames(peak, Vmin, Vmax, ncolors,
+            progress=progress))
+    return qdata, qlevels
+
+def make_lut(cmap):
+    '''
+    Return a (cmap.N, 4) uint8 array of the RGBA colors of a matplotlib
+    colormap, so that lut[qdata[frame_num]] is an RGBA image of a frame.
+    '''
+    return cmap(np.arange(cmap.N), bytes=True)
@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+
+# netlayers - a version of netview.py that shows the network data files of
+# several layers side by side, played from one clock.  The do_network_out
+# function of ACnet2-batch.g writes the files Ex_netview_{RUNID},
+# Inh_netview_{RUNID} and EPSC_netview_{RUNID} for each run, with grids of
+# different sizes for the excitatory and inhibitory layers.  Given a RUNID,
+# netlayers finds the files of that run in the current directory, e.g.
+#
+#    netlayers.py B0003
+#    netlayers.py Ex_netview_B0003.txt EPSC_netview_B0003.txt
+#
+# The controls, menus and data loading are those of netview.py.  Each layer
+# is loaded by its own thread through the netdata frame cache (shared with
+# netview), and the frames are read from the memory mapped cache as they
+# are shown, rather than copied into memory.
+
+import sys, os, glob, time, threading
+
+import wx
+
+import numpy as np
+
+import netview
+import netdata
+
+# The layers written by do_network_out, as (file name prefix, panel title,
+# color scale percentiles).  As in netview-I.py, a few very large EPSC
+# values at the beginning of the run are kept from setting the scale.
+LAYERS = [('Ex_netview', 'Ex', None), ('Inh_netview', 'Inh', None),
+    ('EPSC_netview', 'EPSC', (0, 99.5))]
+
+# Files made by netdata next to a data file, which are not data files
+SIDECAR_SUFFIXES = (netdata.CACHE_SUFFIX, netdata.INDEX_SUFFIX,
+    netdata.PYRAMID_SUFFIX, netdata.TRACE_SUFFIX, '.tmp')
+
+def find_layer_files(spec):
+    '''
+    Return a list of the data files for spec, which is either a RUNID, or
+    data file names separated by spaces.  For a RUNID, the first file
+    found for each of the LAYERS is used, so a FMT1 '.dat' file is taken
+    before a '.txt' file.
+    '''
+    names = spec.split()
+    if len(names) == 1 and not os.path.exists(names[0]):
+        runid = names[0]
+        names = []
+        for prefix, title, percentiles in LAYERS:
+            files = [f for f in sorted(glob.glob('%s_%s.*' % (prefix, runid)))
+                if not f.endswith(SIDECAR_SUFFIXES)]
+            if files:
+                names.append(files[0])
+    return names
+
+class Layer:
+    '''
+    Layer holds the data file, the parameters from its header, and the
+    loaded data and display state of one panel.
+    '''
+    def __init__(self, filename, header):
+        self.filename = filename
+        self.title = os.path.basename(filename)
+        self.percentiles = None
+        for prefix, title, percentiles in LAYERS:
+            if self.title.startswith(prefix):
+                self.title, self.percentiles = title, percentiles
+        self.Ntimes = header['Ntimes']
+        self.t_min = header['t_min']
+        self.dt = header['dt']
+        self.NX = header['NX']
+        self.NY = header['NY']
+        self.axes = None
+        self.im = None
+        self.reset()
+
+    def reset(self):
+        self.data = None
+        self.pyramid = None
+        self.done = False
+        self.failed = False
+        self.frames_ready = 0
+        self.Vmin, self.Vmax = 0.0, 1.0
+        # the frames and time pyramid as color indices for the color
+        # limits qclim, once they have been converted
+        self.qdata = self.qpyramid = self.qclim = None
+        # the loaded frames, for plotting the traces of clicked cells
+        self.trace_source = None
+        # (frame number, pyramid level) of the frame shown in the panel
+        self.shown = None
+
+    def color_range(self, sketch):
+        ''' Return the color limits for the values in a RangeSketch '''
+        if self.percentiles is None:
+            return sketch.vmin, sketch.vmax
+        return sketch.limits(*self.percentiles)
+
+class LayersFrame(netview.PlotFrame):
+    """
+        LayersFrame is a netview PlotFrame with a panel for each layer of
+        a network simulation run.  The time sliders, buttons and playback
+        clock of PlotFrame drive all of the panels, and show_frame draws
+        the frame of each layer at the time of the clock.
+    """
+
+    # room for three panels side by side
+    fig_size = (8.0, 4.5)
+
+    def __init__(self, title, pos, size):
+        self.layers = []
+        netview.PlotFrame.__init__(self, title, pos, size)
+        # a RUNID, or a list of files
+        self.filename = ' '.join(sys.argv[1:])
+
+    def create_main_panel(self):
+        netview.PlotFrame.create_main_panel(self)
+        # the panel axes are added by init_plot
+        self.fig.delaxes(self.axes)
+        self.axes = None
+
+    def get_data_params(self):
+        '''
+        Find the data files for the RUNID or file list in self.filename,
+        and read their headers.  The common clock uses the smallest time
+        step of the layers, and its time window is the part of the run
+        that is in all of the files.  Return False if there are no files.
+        '''
+        if len(self.filename) == 0:
+            # fake a button press of File/Open
+            self.OnOpen(wx.EVT_BUTTON)
+        for layer in self.layers:
+            if layer.axes is not None:
+                self.fig.delaxes(layer.axes)
+        self.layers = []
+        for filename in find_layer_files(self.filename):
+            header = netdata.read_header(filename)
+            if header is None:
+                print 'No header line in ', filename, ' - not shown'
+            else:
+                self.layers.append(Layer(filename, header))
+        if not self.layers:
+            wx.MessageBox('No network data files found for ' + self.filename,
+                "File Error", wx.OK | wx.ICON_ERROR, self)
+            return False
+        self.dt = min(layer.dt for layer in self.layers)
+        self.t_min = self.layers[0].t_min
+        self.Ntimes = min(int((layer.Ntimes - 1)*layer.dt/self.dt) + 1
+            for layer in self.layers)
+        self.t_max = (self.Ntimes - 1)*self.dt
+        # reset slider max and min
+        self.stmin.valmax = self.t_max
+        self.stmin.valinit = self.t_min
+        self.stmax.valmax = self.t_max
+        self.stmax.valinit = self.t_max
+        self.stmax.set_val(self.t_max)
+        self.stmin.reset()
+        self.stmax.reset()
+        return True
+
+    def init_plot(self):
+        '''
+        init_plot creates an Axes with a blank AxesImage for each layer, in
+        a row of panels.  The frames are shown as RGBA images made with the
+        color lookup table, so each panel has its own color scale.
+        '''
+        cmap = netdata.hot_colormap()
+        self.lut = netdata.make_lut(cmap)
+        for i, layer in enumerate(self.layers):
+            layer.axes = self.fig.add_subplot(1, len(self.layers), i + 1)
+            layer.axes.set_title(layer.title)
+            data0 = np.zeros((layer.NY, layer.NX, 4), dtype=np.uint8)
+            layer.im = layer.axes.imshow(data0, origin='lower',
+                interpolation='nearest')
+        self.fig.suptitle('View of ' + self.filename)
+        # used by PlotFrame.plot_data
+        self.im = self.layers[0].im
+        self.Vmin, self.Vmax = 0.0, 1.0
+        self.canvas.draw()
+
+    def get_xyt_data(self):
+        # Start a loader thread for each layer.  The threads post the same
+        # events as the netview loader, with the Layer that they load.
+        self.data_loaded = False
+        self.frames_ready = 0
+        self.load_start = time.time()
+        self.trace_frame = None
+        # stop the threads of the last load, which may still be making
+        # trace caches
+        if self.cancel_load is not None:
+            self.cancel_load.set()
+        self.cancel_load = threading.Event()
+        self.loader = []
+        for layer in self.layers:
+            layer.reset()
+            thread = threading.Thread(target=self.load_layer,
+                args=(layer, self.cancel_load))
+            thread.daemon = True
+            self.loader.append(thread)
+        self.rewind_button.SetLabel("Cancel Load")
+        self.SetStatusText('Loading %d layers ...' % len(self.layers))
+        for thread in self.loader:
+            thread.start()
+
+    def load_layer(self, layer, cancel):
+        '''
+        load_layer runs in a loader thread started by get_xyt_data, and
+        loads the frames and time pyramid of one layer, as in
+        PlotFrame.load_data.
+        '''
+        def progress(frames, nread, nbytes, sketch):
+            if cancel.is_set():
+                raise netdata.LoadCancelled()
+            Vmin, Vmax = layer.color_range(sketch)
+            wx.PostEvent(self, netview.LoadProgressEvent(load_id=cancel,
+                layer=layer, frames=frames, nread=nread, nbytes=nbytes,
+                Vmin=Vmin, Vmax=Vmax))
+
+        data = info = pyramid = error = None
+        try:
+            data, info = netdata.load_network_frames(layer.filename,
+                layer.Ntimes, layer.t_min, layer.dt, layer.NX, layer.NY,
+                progress, cache=self.use_cache)
+            if isinstance(data, np.ndarray):
+                pyramid = netdata.load_pyramid(layer.filename, data, info)
+        except netdata.LoadCancelled:
+            error = 'cancelled'
+        except Exception, e:
+            error = str(e)
+        wx.PostEvent(self, netview.LoadDoneEvent(load_id=cancel, layer=layer,
+            data=data, info=info, pyramid=pyramid, error=error))
+
+    def layer_frame(self, layer, frame_num):
+        ''' Return the frame of layer at the time of clock frame frame_num '''
+        return int(frame_num*self.dt/layer.dt + 0.5)
+
+    def update_frames_ready(self):
+        # the clock can play up to the last frame loaded in every layer
+        ready = []
+        for layer in self.layers:
+            if layer.failed:
+                continue
+            if layer.frames_ready == 0:
+                ready.append(0)
+            else:
+                ready.append(int((layer.frames_ready - 1)*layer.dt/self.dt)
+                    + 1)
+        self.frames_ready = min(min(ready), self.Ntimes) if ready else 0
+
+    def OnLoadProgress(self, event):
+        if event.load_id is not self.cancel_load:
+            return
+        layer = event.layer
+        layer.data = event.frames
+        layer.frames_ready = event.nread
+        layer.Vmin, layer.Vmax = event.Vmin, event.Vmax
+        self.update_frames_ready()
+        if not self.playing:
+            self.SetStatusText('Loaded %d of %d frames of all layers'
+                ' - click Play' % (self.frames_ready, self.Ntimes))
+
+    def OnLoadDone(self, event):
+        if event.load_id is not self.cancel_load:
+            return
+        layer = event.layer
+        layer.done = True
+        if event.error is not None:
+            layer.failed = True
+            layer.data = None
+            if event.error != 'cancelled':
+                wx.MessageBox('Error loading ' + layer.filename + ':\n\n' +
+                    event.error, "Load Error", wx.OK | wx.ICON_ERROR, self)
+        else:
+            info = event.info
+            layer.data = event.data
+            layer.pyramid = event.pyramid
+            layer.frames_ready = info['Ntimes']
+            layer.Vmin, layer.Vmax = layer.color_range(info['sketch'])
+            layer.trace_source = netview.TraceSource(layer.filename,
+                layer.data, info['t_min'], info['dt'], layer.title)
+            print layer.title, ': Vmin = ', layer.Vmin, ' Vmax = ', layer.Vmax
+            if (layer.Vmin, layer.Vmax) != layer.qclim:
+                self.start_quantize(layer.data, layer.pyramid, layer.Vmin,
+                    layer.Vmax, layer=layer)
+        self.update_frames_ready()
+        if not all(l.done for l in self.layers):
+            return
+        # all of the layers have finished loading
+        self.loader = None
+        self.rewind_button.SetLabel("New Data")
+        if self.frames_ready == 0:
+            self.stop_play()
+            self.SetStatusText('Data loading cancelled or failed')
+            return
+        self.Ntimes = self.frames_ready
+        self.t_max = min(self.t_max, (self.Ntimes - 1)*self.dt)
+        self.data_loaded = True
+        if not self.playing:
+            self.SetStatusText('Data has been loaded (%.1f s) - click Play'
+                % (time.time() - self.load_start))
+
+    def OnQuantizeDone(self, event):
+        layer = event.layer
+        if event.load_id is not self.cancel_load:
+            return
+        if event.clim != (layer.Vmin, layer.Vmax):
+            return
+        layer.qdata, layer.qpyramid = event.qdata, event.qpyramid
+        layer.qclim = event.clim
+        # redraw the panel with the converted frames
+        layer.shown = None
+
+    def find_cell(self, event):
+        '''
+        Return (source, x, y) for the cell under the mouse event in the
+        panel of a loaded layer, where source is its TraceSource, or None.
+        '''
+        for layer in self.layers:
+            if event.inaxes is layer.axes and layer.trace_source is not None:
+                x = int(event.xdata + 0.5)
+                y = int(event.ydata + 0.5)
+                if 0 <= x < layer.NX and 0 <= y < layer.NY:
+                    return layer.trace_source, x, y
+        return None
+
+    def show_frame(self, frame_num):
+        '''
+        Display clock frame frame_num in each panel.  Only the panels whose
+        frame has changed are redrawn and blitted, so a layer with a
+        larger time step is drawn less often.
+        '''
+        self.frame_num = frame_num
+        self.SetStatusText('time: '+str(frame_num*self.dt))
+        for layer in self.layers:
+            if layer.data is None or layer.frames_ready == 0:
+                continue
+            n = min(self.layer_frame(layer, frame_num), layer.frames_ready - 1)
+            # the frames converted to color indices, or the data frames
+            # to convert as they are shown
+            quantized = layer.qclim == (layer.Vmin, layer.Vmax)
+            if quantized:
+                data, pyramid = layer.qdata, layer.qpyramid
+            else:
+                data, pyramid = layer.data, layer.pyramid
+            level = netdata.pyramid_level(pyramid, self.step)
+            if level is not None:
+                mean, peak = pyramid[level]
+                if n >> level >= len(mean):
+                    level = None
+            if (n, level) == layer.shown:
+                continue
+            layer.shown = (n, level)
+            if level is None:
+                frame = data[n]
+            elif self.fast_view == 'mean':
+                frame = mean[n >> level]
+            else:
+                frame = peak[n >> level]
+            if quantized:
+                qframe = frame
+            else:
+                qframe = netdata.quantize_frames(
+                    np.asarray(frame)[np.newaxis], layer.Vmin, layer.Vmax,
+                    len(self.lut))[0]
+            layer.im.set_data(self.lut[qframe])
+            layer.axes.draw_artist(layer.im)
+            self.canvas.blit(layer.axes.bbox)
+
+    def plot_data(self):
+        # redraw every panel at the start of play
+        for layer in self.layers:
+            layer.shown = None
+        netview.PlotFrame.plot_data(self)
+
+    def OnRewind(self, event):
+        # While loading, this is the Cancel Load button
+        if self.loader is not None:
+            self.cancel_load.set()
+            return
+        self.stop_play()
+        self.frame_num = None
+        if self.get_data_params():
+            self.init_plot()
+            self.get_xyt_data()
+
+    class UsageFrame(netview.PlotFrame.UsageFrame):
+        text = """
+<HTML>
+<HEAD></HEAD>
+<BODY BGCOLOR="#D6E7F7">
+
+<CENTER><H1>Using netlayers</H1></CENTER>
+
+<p>netlayers shows the Ex_netview, Inh_netview and EPSC_netview files of
+one simulation run side by side, and plays them together.  Give the RUNID
+of the run on the command line (or with <em>File/Open</em>), and the files
+named {prefix}_{RUNID} with any of the file types read by netview are
+found in the current directory.  A list of data files separated by spaces
+can be given instead.  Each file must have a netview header line.</p>
+
+<p>The controls are the same as in netview.  <strong>New Data</strong>
+loads all of the layers at once, and <strong>Play</strong> can be clicked
+as soon as the first frames of every layer have been read.  The time
+sliders, <strong>STOP</strong>, <strong>Single Step</strong>,
+<strong>Forward/Back</strong> and <strong>Normal/Fast</strong> act on all
+of the panels.  Each panel has its own color scale, and the EPSC scale
+leaves out the largest 0.5% of the values.</p>
+
+<p>The layers use the same frame cache files as netview, so a run that
+has been viewed with netview starts immediately, and only the frames that
+are shown are read from the cache.</p>
+
+<HR>
+</BODY>
+</HTML>
+        """
+
+class MainApp(wx.App):
+    def OnInit(self):
+       frame = LayersFrame("G-3 Network Layers View", (50, 60), (900, 600))
+       frame.Show()
+       self.SetTopWindow(frame)
+       return True
+
+if __name__ == '__main__':
+    app = MainApp(False)
+    app.MainLoop()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+# netmovie - a command line utility to render the network data files that
+# are viewed with netview.py into a movie or a sequence of PNG images,
+# without needing a display or wxPython.  It uses the same data file
+# reading, color scaling and GENESIS 2 'hot' color scale as netview, and
+# draws the frames with the matplotlib Agg backend.  Movies are encoded by
+# piping the frames to ffmpeg, which must be installed on the PATH.
+#
+# Typical usage:
+#
+#    netmovie.py -o Ex_netview_B0003.mp4 Ex_netview_B0003.txt.bz2
+#    netmovie.py --tmin 0.2 --tmax 0.5 --stride 5 -j 8 Ex_netview_B0003.dat
+#    netmovie.py -o frames/B0003_%05d.png Ex_netview_B0003.txt
+
+import sys, os
+import subprocess
+import multiprocessing
+
+from optparse import OptionParser
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigCanvas
+
+import numpy as np
+
+import netdata
+
+# Per-process rendering state, set up by init_renderer
+renderer = None
+
+def frame_source(data):
+    '''
+    Return a description of the frames in data, as loaded by the parent
+    process, from which open_frames gets them in a worker process without
+    reading the data file again.  A memory mapped frame cache or FMT1 file
+    is described by its path and layout, and a Bz2Frames by its block
+    index.  Frames held in memory are passed as they are.
+    '''
+    if isinstance(data, np.memmap):
+        return ('memmap', data.filename, data.offset, data.dtype.str,
+            data.shape)
+    if isinstance(data, netdata.Bz2Frames):
+        return ('bz2', data.filename, data.info, data.blocks())
+    return ('array', data)
+
+def open_frames(source):
+    ''' Return the frames described by frame_source '''
+    if source[0] == 'memmap':
+        filename, offset, dtype, shape = source[1:]
+        return np.memmap(filename, dtype=np.dtype(dtype), mode='r',
+            offset=offset, shape=shape)
+    if source[0] == 'bz2':
+        return netdata.Bz2Frames(*source[1:])
+    return source[1]
+
+class FrameRenderer:
+    '''
+    FrameRenderer draws the frames of a data file with an Agg canvas, in
+    the same layout as the netview image.  One is created in each worker
+    process, and it opens the frames loaded by the parent, given by
+    frame_source, so that the data file is not read again.
+    '''
+    def __init__(self, source, filename, params, Vmin, Vmax, size, dpi):
+        self.params = params
+        self.Vmin = Vmin
+        self.Vmax = Vmax
+        self.data = open_frames(source)
+        cmap = netdata.hot_colormap()
+        self.lut = netdata.make_lut(cmap)
+        self.fig = Figure((size[0]/float(dpi), size[1]/float(dpi)), dpi=dpi)
+        self.canvas = FigCanvas(self.fig)
+        self.axes = self.fig.add_subplot(111)
+        self.axes.set_title("View of " + os.path.basename(filename))
+        data0 = np.zeros((params['NY'], params['NX'], 4), dtype=np.uint8)
+        self.im = self.axes.imshow(data0, origin='lower',
+            interpolation='nearest')
+        self.time_text = self.fig.text(0.5, 0.04, '', ha='center')
+
+    def draw(self, frame_num):
+        frame = netdata.quantize_frames(self.data[frame_num:frame_num + 1],
+            self.Vmin, self.Vmax, len(self.lut))[0]
+        self.im.set_data(self.lut[frame])
+        self.time_text.set_text('time: ' + str(frame_num*self.params['dt']))
+        self.canvas.draw()
+
+    def rgba(self, frame_num):
+        ''' Return the RGBA bytes of the rendered frame '''
+        self.draw(frame_num)
+        return bytes(self.canvas.buffer_rgba())
+
+    def png(self, frame_num, filename):
+        self.draw(frame_num)
+        self.canvas.print_png(filename)
+        return filename
+
+def init_renderer(*args):
+    global renderer
+    renderer = FrameRenderer(*args)
+
+def render_rgba(frame_num):
+    return renderer.rgba(frame_num)
+
+def render_png(job):
+    return renderer.png(*job)
+
+def frame_numbers(params, tmin, tmax, stride):
+    ''' Return the frames to render for the time window and stride '''
+    dt = params['dt']
+    frame_min = 0 if tmin is None else max(0, int(tmin/dt))
+    frame_max = params['Ntimes'] - 1
+    if tmax is not None:
+        frame_max = min(int(tmax/dt), frame_max)
+    return range(frame_min, frame_max + 1, stride)
+
+def export_frames(filename, output, params, frames, fps=25, jobs=1,
+                  Vmin=None, Vmax=None, size=(480, 640), dpi=100,
+                  cache=True, percentiles=None):
+    '''
+    Render the given frames of filename to output, which is either a movie
+    file for ffmpeg, or a file name pattern with a '%d' style format for a
+    sequence of PNG images.  The data is loaded (and the frame cache made)
+    here, then the frames are drawn by jobs worker processes, which only
+    open the loaded frames and the color limits found here, and the
+    images are written (or piped to ffmpeg) in order as they are finished.
+    With cache = False, a bz2 file is read through its block index, and
+    only the blocks holding the frames to render are decoded.  The color
+    scale is the data range, or the (low, high) percentiles of the values
+    if percentiles is given, unless Vmin or Vmax are set.
+    '''
+    data, info = netdata.load_network_frames(filename, params['Ntimes'],
+        params['t_min'], params['dt'], params['NX'], params['NY'],
+        cache=cache)
+    params['Ntimes'] = info['Ntimes']
+    frames = [f for f in frames if f < info['Ntimes']]
+    if percentiles is None:
+        limits = info['Vmin'], info['Vmax']
+    else:
+        limits = info['sketch'].limits(*percentiles)
+    if Vmin is None:
+        Vmin = limits[0]
+    if Vmax is None:
+        Vmax = limits[1]
+    init_args = (frame_source(data), filename, params, Vmin, Vmax, size,
+        dpi)
+    del data
+
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs, init_renderer, init_args)
+        imap = pool.imap
+    else:
+        pool = None
+        init_renderer(*init_args)
+        imap = lambda func, items, chunksize=1: (func(i) for i in items)
+    chunksize = max(1, min(16, len(frames)//(4*jobs)))
+
+    try:
+        if '%' in output:
+            outdir = os.path.dirname(output)
+            if outdir and not os.path.isdir(outdir):
+                os.makedirs(outdir)
+            jobs_list = [(f, output % n) for n, f in enumerate(frames)]
+            for n, name in enumerate(imap(render_png, jobs_list, chunksize)):
+                if (n + 1) % 100 == 0:
+                    print 'Wrote %d of %d frames' % (n + 1, len(frames))
+        else:
+            command = ['ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'rgba',
+                '-s', '%dx%d' % size, '-r', str(fps), '-i', '-',
+                '-pix_fmt', 'yuv420p', output]
+            try:
+                ffmpeg = subprocess.Popen(command, stdin=subprocess.PIPE)
+            except OSError, e:
+                sys.exit('Could not run ffmpeg: %s' % e)
+            for n, buf in enumerate(imap(render_rgba, frames, chunksize)):
+                ffmpeg.stdin.write(buf)
+                if (n + 1) % 100 == 0:
+                    print 'Encoded %d of %d frames' % (n + 1, len(frames))
+            ffmpeg.stdin.close()
+            if ffmpeg.wait() != 0:
+                sys.exit('ffmpeg failed to encode ' + output)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    print 'Wrote %d frames to %s' % (len(frames), output)
+
+if __name__ == "__main__":
+    usage = "%prog [OPTIONS] datafile"
+    description = """
+netmovie renders a netview data file (plain text, bzip2 compressed text,
+or GENESIS FMT1 binary) to a movie encoded by ffmpeg, or to a sequence of
+PNG images if the output name contains a format such as '%05d'.  It does
+not need a display.
+    """
+    parser = OptionParser(usage=usage, description=description)
+    parser.add_option("-o", "--output", dest="output", type="string",
+        help="movie file or PNG name pattern (default: datafile.mp4)")
+    parser.add_option("--tmin", dest="tmin", type="float", default=None,
+        help="start time of the window to render (sec)")
+    parser.add_option("--tmax", dest="tmax", type="float", default=None,
+        help="end time of the window to render (sec)")
+    parser.add_option("-s", "--stride", dest="stride", type="int", default=1,
+        help="render every stride'th frame (default 1)")
+    parser.add_option("-r", "--fps", dest="fps", type="int", default=25,
+        help="movie frames per second (default 25)")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1,
+        help="number of worker processes for rendering (default 1)")
+    parser.add_option("--vmin", dest="vmin", type="float", default=None,
+        help="value for the bottom of the color scale (default data min)")
+    parser.add_option("--vmax", dest="vmax", type="float", default=None,
+        help="value for the top of the color scale (default data max)")
+    parser.add_option("-p", "--percentiles", dest="percentiles",
+        type="float", nargs=2, default=None,
+        help="percentiles of the data for the color scale, e.g. 1 99")
+    parser.add_option("--size", dest="size", type="int", nargs=2,
+        default=(480, 640), help="image width and height in pixels")
+    netdata.add_data_file_options(parser)
+    (options, args) = parser.parse_args()
+
+    if len(args) != 1 or not os.path.exists(args[0]):
+        parser.error("Need one existing data file to render")
+    filename = args[0]
+    params = netdata.data_file_params(filename, options)
+    output = options.output
+    if output is None:
+        output = os.path.splitext(filename.replace('.bz2', ''))[0] + '.mp4'
+    frames = frame_numbers(params, options.tmin, options.tmax,
+        max(1, options.stride))
+    export_frames(filename, output, params, frames, fps=options.fps,
+        jobs=max(1, options.jobs), Vmin=options.vmin, Vmax=options.vmax,
+        size=tuple(options.size), cache=options.cache,
+        percentiles=options.percentiles)
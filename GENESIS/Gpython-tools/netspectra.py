@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# netspectra - a command line utility to calculate the Power Spectral
+# Density (PSD) of every cell in a netview data file (EPSC_netview or
+# Ex_netview, as plain text, bzip2 compressed text, or GENESIS FMT1 binary),
+# and plot the power of each cell at the stimulus frequency as an NX x NY
+# map.  This shows which parts of the network follow the stimulus, where
+# spectra_funcs3.g finds only the spectrum of the summed EPSC.  The spectra
+# are calculated with spectra.py, as by plotPSD.py, and the data is read
+# through the netview frame cache, or with --no-cache through the block
+# index of a bzip2 file.
+#
+# Typical usage:
+#
+#    netspectra.py -f 40 EPSC_netview_B0003.txt.bz2
+#    netspectra.py -f 40 -n 1024 -o power_B0003.txt Ex_netview_B0003.dat
+
+import os
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from optparse import OptionParser
+
+import netdata
+import spectra
+
+if __name__ == "__main__":
+    usage = "%prog [OPTIONS] datafile"
+    parser = OptionParser(usage=usage)
+    parser.add_option("-f", "--frequency", dest="frequency", type="float",
+        help="stimulus frequency in Hz")
+    parser.add_option("-n", "--nfft", dest="nfft", type="int", default=None,
+        help="number of frames in each PSD segment "
+        "(default: a quarter of the frames after the start time)")
+    parser.add_option("-s", "--tstart", dest="tstart", type="float",
+        default=0.2, help="time of the first frame used (default 0.2 sec)")
+    parser.add_option("-o", "--output", dest="output", type="string",
+        help="text file for the power map, with a line for each row of cells")
+    parser.add_option("--no-plot", dest="plot", action="store_false",
+        default=True, help="don't plot the power map")
+    netdata.add_data_file_options(parser)
+    (options, args) = parser.parse_args()
+
+    if len(args) != 1 or not os.path.exists(args[0]):
+        parser.error("Need one existing data file to read")
+    if options.frequency is None:
+        parser.error("Please give the stimulus frequency with -f")
+    filename = args[0]
+    params = netdata.data_file_params(filename, options)
+
+    data, info = netdata.load_network_frames(filename, params['Ntimes'],
+        params['t_min'], params['dt'], params['NX'], params['NY'],
+        cache=options.cache)
+    pxx, freqs = spectra.network_psd(data, params['dt'], params['t_min'],
+        options.tstart, options.nfft)
+    power, freq = spectra.power_at(pxx, freqs, options.frequency)
+    print 'PSD of %d cells, with %g Hz resolution' % (power.size, freqs[1])
+    print 'Power at %g Hz: min %g, mean %g, max %g' % (freq, power.min(),
+        power.mean(), power.max())
+    if options.output:
+        np.savetxt(options.output, power, fmt='%g')
+        print 'Wrote the %d x %d power map to %s' % (params['NX'],
+            params['NY'], options.output)
+
+    if options.plot:
+        fig = plt.figure(1, figsize=(8,6))
+        axes = fig.add_subplot(111)
+        im = axes.imshow(power, origin='lower', interpolation='nearest',
+            cmap='hot')
+        fig.colorbar(im)
+        axes.set_title('Power at %g Hz of %s' % (freq,
+            os.path.basename(filename)))
+        axes.set_xlabel('cell x position')
+        axes.set_ylabel('cell y position')
+        plt.show()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+# netspikes - a command line utility to find the spikes of every cell in a
+# netview soma Vm data file (Ex_netview or Inh_netview, as plain text, bzip2
+# compressed text, or GENESIS FMT1 binary), and write them to a binary spike
+# store for rasterplot.py and the other spike tools.  This makes a raster
+# of any archived run without running the simulation again with spike
+# time output.  The data is read through the netview frame cache, or with
+# --no-cache through the block index of a bzip2 file.
+#
+# Typical usage:
+#
+#    netspikes.py Ex_netview_B0003.txt.bz2
+#    netspikes.py -t -0.02 --interpolate -o B0003.spk Ex_netview_B0003.dat
+
+import os
+import re
+
+from optparse import OptionParser
+
+import netdata
+import spikedata
+
+def default_runid(filename):
+    ''' Return the RUNID in a name like Ex_netview_B0003.txt, or '' '''
+    match = re.match(r'\w+_netview_(\w+?)\.', os.path.basename(filename))
+    if match is None:
+        return ''
+    return match.group(1)
+
+if __name__ == "__main__":
+    usage = "%prog [OPTIONS] datafile"
+    parser = OptionParser(usage=usage)
+    parser.add_option("-o", "--output", dest="output", type="string",
+        help="spike store file (default: datafile.spk)")
+    parser.add_option("-t", "--threshold", dest="threshold", type="float",
+        default=0.0, help="spike threshold in Volts (default 0.0)")
+    parser.add_option("-i", "--interpolate", dest="interpolate",
+        action="store_true", default=False,
+        help="interpolate the threshold crossing time between frames")
+    parser.add_option("--runid", dest="runid", type="string", default=None,
+        help="RUNID of the run (default: from the header or file name)")
+    netdata.add_data_file_options(parser)
+    (options, args) = parser.parse_args()
+
+    if len(args) != 1 or not os.path.exists(args[0]):
+        parser.error("Need one existing data file to read")
+    filename = args[0]
+    params = netdata.data_file_params(filename, options)
+    RUNID = options.runid
+    if RUNID is None:
+        RUNID = params.get('RUNID') or default_runid(filename)
+    output = options.output
+    if output is None:
+        output = os.path.splitext(filename.replace('.bz2', ''))[0] + \
+            spikedata.SPIKE_SUFFIX
+
+    data, info = netdata.load_network_frames(filename, params['Ntimes'],
+        params['t_min'], params['dt'], params['NX'], params['NY'],
+        cache=options.cache)
+    times, offsets = spikedata.find_spikes(data, params['t_min'],
+        params['dt'], options.threshold, options.interpolate)
+    spikedata.write_spike_store(output, times, offsets, RUNID,
+        params['NX'], params['NY'])
+    print 'Wrote %d spikes of %d cells to %s' % (len(times),
+        len(offsets) - 1, output)
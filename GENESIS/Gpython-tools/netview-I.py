@@ -3,13 +3,14 @@
 # Basic wxPython frame to hold a matplotlib figure for plotting
 # It defines some basic menu items with bindings to functions to execute
 
-import sys, os, glob, time, math, bz2
+import sys, os, glob, time, math, threading
 
 # import needed wxPython modules
 
 import wx
 import wx.html
 import	wx.lib.dialogs
+import wx.lib.newevent
 from wx.lib.stattext import GenStaticText
 
 import matplotlib
@@ -26,6 +27,14 @@ import matplotlib.font_manager as font_manager
 
 import numpy as np
 
+import netdata
+
+# Events posted to the PlotFrame by the threads that load the data, and
+# convert it to color indices
+LoadProgressEvent, EVT_LOAD_PROGRESS = wx.lib.newevent.NewEvent()
+LoadDoneEvent, EVT_LOAD_DONE = wx.lib.newevent.NewEvent()
+QuantizeDoneEvent, EVT_QUANTIZE_DONE = wx.lib.newevent.NewEvent()
+
 # Class for fancy labeled text entry widget
 class XDialog(wx.Panel):
     def __init__(self, parent, *args, **kwargs):
@@ -48,6 +57,45 @@ class XDialog(wx.Panel):
 
 	self.SetSizer(dlg_sizer)
     
+# Window with plots of the time series of cells clicked on in the image
+class TraceFrame(wx.Frame):
+    def __init__(self, parent, title):
+        wx.Frame.__init__(self, parent, wx.ID_ANY, title, size=(640, 400))
+        self.fig = Figure((6.0, 3.5), dpi=100)
+        self.canvas = FigCanvas(self, wx.ID_ANY, self.fig)
+        self.axes = self.fig.add_subplot(111)
+        self.axes.set_xlabel('time (sec)')
+        self.toolbar = NavigationToolbar(self.canvas)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(self.canvas, 1, wx.EXPAND)
+        sizer.Add(self.toolbar, 0, wx.EXPAND)
+        self.SetSizer(sizer)
+        self.Fit()
+
+    def add_trace(self, t, trace, label):
+        ''' Plot another trace on the axes, and label it in the legend '''
+        self.axes.plot(t, trace, label=label)
+        self.axes.legend(loc='best',
+            prop=font_manager.FontProperties(size=10))
+        self.canvas.draw()
+
+# Frames of a data file whose cells can be clicked on to plot their traces
+class TraceSource:
+    '''
+    TraceSource holds the frames loaded from a data file, the time of the
+    first frame and the time step, and the trace cache of the cells once
+    it has been made.  name labels the traces of a layer in netlayers.
+    '''
+    def __init__(self, filename, frames, t_min, dt, name=''):
+        self.filename = filename
+        self.frames = frames
+        self.t_min = t_min
+        self.dt = dt
+        self.name = name
+        self.NY, self.NX = frames.shape[1:]
+        self.traces = None
+        self.loader = None
+
 # custom frame to hold the panel with a Figure and WxAgg backend canvas
 class PlotFrame(wx.Frame):
     """
@@ -62,6 +110,9 @@ class PlotFrame(wx.Frame):
         canvas, an instance of MPL FigureCanvasWxAgg.
     """
 
+    # size of the Figure in inches
+    fig_size = (3.5, 5.0)
+
     # Main function to set everything up when the frame is created
     def __init__(self, title, pos, size):
 
@@ -77,11 +128,45 @@ class PlotFrame(wx.Frame):
             self.filename =  sys.argv[1]
 
         # set some Boolean flags
-        self.STOP = False
+        self.playing = False
         self.data_loaded = False
         self.reverse_play = False
 
         self.step = 1
+        # default time window, until the data parameters are read
+        self.t_min = 0.0
+        self.t_max = 1.0
+        # playback state: target frames per second, and the frame shown
+        self.fps = 50
+        self.frame_num = None
+        # show frames as uint8 color indices with a color lookup table.
+        # The frames (and the time pyramid) are converted once after the
+        # load, for the color limits qclim, and until then each frame is
+        # converted as it is shown.
+        self.quantize = True
+        self.qdata = None
+        self.qpyramid = None
+        self.qclim = None
+        # write a frame cache on the first load; if False, bz2 files are
+        # read a block at a time through a block index for random access
+        self.use_cache = True
+        # color scale limits: the data range if None, or a pair of
+        # percentiles of the data values, e.g. (1, 99) to ignore outliers
+        # Scale EPSC data to the bulk of the values - most points are < 2 nA,
+        # but a few very large ones at the beginning would set the maximum
+        self.clim_percentiles = (0, 99.5)
+        # time pyramid of decimated frames, and whether Fast mode shows the
+        # 'mean' or the 'peak' value of each block of frames that it skips
+        self.pyramid = None
+        self.fast_view = 'peak'
+        # the loaded data, with the cell-major copy of it for the traces
+        # of clicked cells, and the window with the traces
+        self.trace_source = None
+        self.trace_frame = None
+        # data loading thread, and the number of frames loaded so far
+        self.loader = None
+        self.cancel_load = None
+        self.frames_ready = 0
 
         #    Make the main Matplotlib panel for plots
         self.create_main_panel()  # creates canvas and contents
@@ -105,6 +190,13 @@ class PlotFrame(wx.Frame):
 
         self.SetStatusText("Frame created ...")
 
+        # The playback timer shows a new frame on each tick
+        self.play_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.OnPlayTimer, self.play_timer)
+        self.Bind(EVT_LOAD_PROGRESS, self.OnLoadProgress)
+        self.Bind(EVT_LOAD_DONE, self.OnLoadDone)
+        self.Bind(EVT_QUANTIZE_DONE, self.OnQuantizeDone)
+
         # -------------------------------------------------------
         #	       set up the Menu Bar
         # -------------------------------------------------------
@@ -169,7 +261,7 @@ class PlotFrame(wx.Frame):
         # 3.5 x 5 inches, 100 dots-per-inch
         #
         self.dpi = 100
-        self.fig = Figure((3.5, 5.0), dpi=self.dpi)
+        self.fig = Figure(self.fig_size, dpi=self.dpi)
         self.canvas = FigCanvas(self.panel, wx.ID_ANY, self.fig)
         
         # Since we have only one plot, we could use add_axes 
@@ -202,14 +294,23 @@ class PlotFrame(wx.Frame):
 
         self.toolbar = NavigationToolbar(self.canvas)
 
+        # clicking on a cell plots its time series
+        self.canvas.mpl_connect('button_press_event', self.OnClick)
+
     def update_trange(self, event):
+        seek = (self.stmin.val != self.t_min)
         self.t_min = self.stmin.val
         self.t_max = self.stmax.val
         # print(self.t_min, self.t_max)
+        # moving the t_min slider during play seeks to the new t_min
+        if seek and self.playing:
+            self.start_play(self.play_window()[0])
 
     def reset_trange(self, event):
         self.stmin.reset()
         self.stmax.reset()
+        # start again at the beginning of the time window
+        self.frame_num = None
 
     def create_button_bar(self):
 	"""
@@ -224,8 +325,8 @@ class PlotFrame(wx.Frame):
 	BoxSizer, after the MPL canvas, during initialization of the frame.
 
 	"""
-	rewind_button = wx.Button(self.panel, -1, "New Data")
-	self.Bind(wx.EVT_BUTTON, self.OnRewind, rewind_button)
+	self.rewind_button = wx.Button(self.panel, -1, "New Data")
+	self.Bind(wx.EVT_BUTTON, self.OnRewind, self.rewind_button)
 
 	replot_button = wx.Button(self.panel, -1, "Play")
 	self.Bind(wx.EVT_BUTTON, self.OnReplot, replot_button)
@@ -253,7 +354,7 @@ class PlotFrame(wx.Frame):
         # bit maps (from a media player skin?) should be used
         # or the buttons and toggle state colors in OnFast() below
 
-        rewind_button.SetBackgroundColour('skyblue')
+        self.rewind_button.SetBackgroundColour('skyblue')
         replot_button.SetBackgroundColour('skyblue')
         sstep_button.SetBackgroundColour('skyblue')
         stop_button.SetBackgroundColour('skyblue')
@@ -263,7 +364,7 @@ class PlotFrame(wx.Frame):
         self.fast_toggle.SetBackgroundColour('yellow')
         self.button_bar_sizer = wx.BoxSizer(wx.HORIZONTAL)
         flags = wx.ALIGN_CENTER | wx.ALL
-        self.button_bar_sizer.Add(rewind_button, 0, border=3, flag=flags)
+        self.button_bar_sizer.Add(self.rewind_button, 0, border=3, flag=flags)
         self.button_bar_sizer.Add(replot_button, 0, border=3, flag=flags)
         self.button_bar_sizer.Add(sstep_button, 0, border=3, flag=flags)
         self.button_bar_sizer.Add(stop_button, 0, border=3, flag=flags)
@@ -287,25 +388,15 @@ class PlotFrame(wx.Frame):
 
         # should check here if file exists as specified [path]/filename
 
-        # assume it is a bzip2 compressed file
-        try:
-      	    fp = bz2.BZ2File(self.filename)
-	    line = fp.readline()
-        except IOError:
-            # then assume plain text
-            fp = open(self.filename)
-	    line = fp.readline()
-       
-        fp.close()
-
-        # check if first line is a header line starting with '#'
-        header = line.split()
-        if header[0][0] == "#": 
-            self.Ntimes = int(header[1])
-            self.t_min =  float(header[2])
-            self.dt = float(header[3])
-            self.NX = int(header[4])
-            self.NY = int(header[5])
+        # check for a header line starting with '#', or a FMT1 binary
+        # file header that gives the network dimensions
+        header = netdata.read_header(self.filename)
+        if header is not None:
+            self.Ntimes = header['Ntimes']
+            self.t_min = header['t_min']
+            self.dt = header['dt']
+            self.NX = header['NX']
+            self.NY = header['NY']
         else:
             pdentry = self.ParamEntryDialog()
             if pdentry.ShowModal() ==  wx.ID_OK:
@@ -326,7 +417,6 @@ class PlotFrame(wx.Frame):
         self.stmax.set_val(self.t_max)
         self.stmin.reset()
         self.stmax.reset()
-        fp.close()
 
     def init_plot(self):
         ''' 
@@ -343,31 +433,8 @@ class PlotFrame(wx.Frame):
         # Note that NumPy array (row, col) = image (y, x)
         data0 = np.zeros((self.NY,self.NX))
 
-        # Define a 'cold' to 'hot' color scale based in GENESIS 2 'hot'
-        hotcolors = ['#000032', '#00003c', '#000046',
-        '#000050', '#00005a', '#000064', '#00006e', '#000078', '#000082',
-        '#00008c', '#000096', '#0000a0', '#0000aa', '#0000b4', '#0000be',
-        '#0000c8', '#0000d2', '#0000dc', '#0000e6', '#0000f0', '#0000fa',
-        '#0000ff', '#000af6', '#0014ec', '#001ee2', '#0028d8', '#0032ce',
-        '#003cc4', '#0046ba', '#0050b0', '#005aa6', '#00649c', '#006e92',
-        '#007888', '#00827e', '#008c74', '#00966a', '#00a060', '#00aa56',
-        '#00b44c', '#00be42', '#00c838', '#00d22e', '#00dc24', '#00e61a',
-        '#00f010', '#00fa06', '#00ff00', '#0af600', '#14ec00', '#1ee200',
-        '#28d800', '#32ce00', '#3cc400', '#46ba00', '#50b000', '#5aa600',
-        '#649c00', '#6e9200', '#788800', '#827e00', '#8c7400', '#966a00',
-        '#a06000', '#aa5600', '#b44c00', '#be4200', '#c83800', '#d22e00',
-        '#dc2400', '#e61a00', '#f01000', '#fa0600', '#ff0000', '#ff0a00',
-        '#ff1400', '#ff1e00', '#ff2800', '#ff3200', '#ff3c00', '#ff4600',
-        '#ff5000', '#ff5a00', '#ff6400', '#ff6e00', '#ff7800', '#ff8200',
-        '#ff8c00', '#ff9600', '#ffa000', '#ffaa00', '#ffb400', '#ffbe00',
-        '#ffc800', '#ffd200', '#ffdc00', '#ffe600', '#fff000', '#fffa00',
-        '#ffff00', '#ffff0a', '#ffff14', '#ffff1e', '#ffff28', '#ffff32',
-        '#ffff3c', '#ffff46', '#ffff50', '#ffff5a', '#ffff64', '#ffff6e',
-        '#ffff78', '#ffff82', '#ffff8c', '#ffff96', '#ffffa0', '#ffffaa',
-        '#ffffb4', '#ffffbe', '#ffffc8', '#ffffd2', '#ffffdc', '#ffffe6',
-        '#fffff0']
-
-        cmap = matplotlib.colors.ListedColormap(hotcolors)
+        # Use a 'cold' to 'hot' color scale based in GENESIS 2 'hot'
+        cmap = netdata.hot_colormap()
 
         self.im = self.axes.imshow(data0, cmap=cmap, origin='lower')
 
@@ -376,6 +443,8 @@ class PlotFrame(wx.Frame):
         # cm.jet, cm.gnuplot and cm.afmhot are good choices, but are unlike G2 'hot'
 
         self.im.cmap=cmap
+        # RGBA lookup table for displaying quantized frames
+        self.lut = netdata.make_lut(cmap)
 
         # Not sure how to properly add a colorbar
         # self.cb = self.fig.colorbar(self.im, orientation='vertical')
@@ -384,41 +453,192 @@ class PlotFrame(wx.Frame):
         self.canvas.draw()      
 
     def get_xyt_data(self):
-        # Create scaled (0-1) luminance(x,y) array from ascii G-2 disk_out file
-        # get the data to plot from the specified filename
-        # Note that NumPy loadtxt transparently deals with bz2 compression
+        # Create the (Ntimes, NY, NX) array of frames from ascii G-2 disk_out
+        # file, and get the data range used to scale the color map.
+        # The first load of a file (plain text or bz2 compressed) writes a
+        # binary cache of the frames next to it, and later loads map the
+        # cache into memory without parsing the text again.  A FMT1 binary
+        # file is mapped into memory directly.  Without the cache, a bz2
+        # file is read through an index of its compressed blocks, and a
+        # frame is decoded from its block when it is shown.
+        # The data is loaded by a separate thread, which posts events with
+        # the progress of the load, so that the frames that have been read
+        # can be played while the rest of the file is loading.  After the
+        # load, a time pyramid of decimated frames is made (or mapped from
+        # the file next to the data) for use in Fast mode.
+        self.data_loaded = False
+        self.frames_ready = 0
+        self.pyramid = None
+        self.qdata = self.qpyramid = self.qclim = None
+        self.trace_source = None
+        self.trace_frame = None
+        self.load_start = time.time()
+        # stop the threads of the last load, which may still be making
+        # its trace cache
+        if self.cancel_load is not None:
+            self.cancel_load.set()
+        self.cancel_load = threading.Event()
+        self.loader = threading.Thread(target=self.load_data,
+            args=(self.filename, self.Ntimes, self.t_min, self.dt,
+            self.NX, self.NY, self.cancel_load))
+        self.loader.daemon = True
+        self.rewind_button.SetLabel("Cancel Load")
         self.SetStatusText('Data loading - please wait ....')
-        rawdata = np.loadtxt(self.filename)
-        # Note the difference between NumPy [row, col] order and network
-        # x-y grid (x, y) = (col, row). We want a NumPy NY x NX, not 
-        # NX x NY, array to be used by the AxesImage object.
-
-        xydata = np.resize(rawdata, (self.Ntimes, self.NY, self.NX))
-        # imshow expects the data to be scaled to range 0-1.
-        Vmin = xydata.min()
-        Vmax = xydata.max()
-        print 'Vmax = ', Vmax
-        # Hack for EPSC data - most points are < 2 nA, but a few are large
-        # Scale data to a more reasonable range
-        Vmax = 2.0e-09
-        self.ldata = (xydata - Vmin)/(Vmax - Vmin)
+        self.loader.start()
+
+    def load_data(self, filename, Ntimes, t_min, dt, NX, NY, cancel):
+        '''
+        load_data runs in the loader thread started by get_xyt_data.  It
+        must not use any wx or matplotlib objects, and passes the results
+        back to the PlotFrame with LoadProgressEvent and LoadDoneEvent.
+        Each event is tagged with the cancel Event of this load, so that
+        events from an earlier load are ignored.
+        '''
+        def progress(frames, nread, nbytes, sketch):
+            if cancel.is_set():
+                raise netdata.LoadCancelled()
+            Vmin, Vmax = self.color_range(sketch)
+            wx.PostEvent(self, LoadProgressEvent(load_id=cancel,
+                frames=frames, nread=nread, nbytes=nbytes,
+                Vmin=Vmin, Vmax=Vmax))
+
+        data = info = pyramid = error = None
+        try:
+            data, info = netdata.load_network_frames(filename, Ntimes,
+                t_min, dt, NX, NY, progress, cache=self.use_cache)
+            if isinstance(data, np.ndarray):
+                pyramid = netdata.load_pyramid(filename, data, info)
+        except netdata.LoadCancelled:
+            error = 'cancelled'
+        except Exception, e:
+            error = str(e)
+        wx.PostEvent(self, LoadDoneEvent(load_id=cancel, data=data,
+            info=info, pyramid=pyramid, error=error))
+
+    def color_range(self, sketch):
+        '''
+        Return the color limits to use for the data values summarized by
+        the netdata.RangeSketch sketch, which is kept up to date while the
+        data is loading.
+        '''
+        if self.clim_percentiles is None:
+            return sketch.vmin, sketch.vmax
+        return sketch.limits(*self.clim_percentiles)
+
+    def OnLoadProgress(self, event):
+        if event.load_id is not self.cancel_load:
+            return
+        self.ldata = event.frames
+        self.frames_ready = event.nread
+        # imshow scales the data to the range 0-1 with the color limits
+        self.Vmin, self.Vmax = event.Vmin, event.Vmax
+        self.im.set_clim(self.Vmin, self.Vmax)
+        if not self.playing:
+            rate = event.nbytes/max(time.time() - self.load_start, 1e-3)/1e6
+            self.SetStatusText('Loaded %d of %d frames (%.1f MB/s) - click Play'
+                % (event.nread, self.Ntimes, rate))
+
+    def OnLoadDone(self, event):
+        if event.load_id is not self.cancel_load:
+            return
+        self.loader = None
+        self.rewind_button.SetLabel("New Data")
+        if event.error is not None:
+            self.stop_play()
+            self.frames_ready = 0
+            if event.error == 'cancelled':
+                self.SetStatusText('Data loading cancelled')
+            else:
+                wx.MessageBox('Error loading ' + self.filename + ':\n\n' +
+                    event.error, "Load Error", wx.OK | wx.ICON_ERROR, self)
+                self.SetStatusText('Data loading failed')
+            return
+        info = event.info
+        self.ldata = event.data
+        self.pyramid = event.pyramid
+        if info['Ntimes'] < self.Ntimes:
+            print 'Only ', info['Ntimes'], ' of ', self.Ntimes, ' frames read'
+            self.Ntimes = info['Ntimes']
+            self.t_max = min(self.t_max, (self.Ntimes - 1)*self.dt)
+        print 'Vmin = ', info['Vmin'], ' Vmax = ', info['Vmax']
+        self.Vmin, self.Vmax = self.color_range(info['sketch'])
+        if self.clim_percentiles is not None:
+            print 'Color scale %g - %g from percentiles %g - %g' % (
+                self.Vmin, self.Vmax, self.clim_percentiles[0],
+                self.clim_percentiles[1])
+        self.im.set_clim(self.Vmin, self.Vmax)
+        self.frames_ready = self.Ntimes
+        self.trace_source = TraceSource(self.filename, self.ldata,
+            info['t_min'], info['dt'])
+        if (self.Vmin, self.Vmax) != self.qclim:
+            self.start_quantize(self.ldata, self.pyramid, self.Vmin, self.Vmax)
         self.data_loaded = True
-        self.SetStatusText('Data has been loaded - click Play')
+        if not self.playing:
+            rate = os.path.getsize(self.filename)/max(time.time() -
+                self.load_start, 1e-3)/1e6
+            self.SetStatusText('Data has been loaded (%.1f MB/s) - click Play'
+                % rate)
+
+    def start_quantize(self, data, pyramid, Vmin, Vmax, **tags):
+        '''
+        Start a thread that converts the frames in data and its time
+        pyramid to indices into the color map for the limits Vmin - Vmax,
+        and posts them back in a QuantizeDoneEvent with the keyword tags.
+        Frames read through a bz2 block index are converted as they are
+        shown.
+        '''
+        if not self.quantize or not isinstance(data, np.ndarray):
+            return
+        thread = threading.Thread(target=self.quantize_data,
+            args=(data, pyramid, Vmin, Vmax, self.cancel_load, tags))
+        thread.daemon = True
+        thread.start()
+
+    def quantize_data(self, data, pyramid, Vmin, Vmax, cancel, tags):
+        ''' Runs in the thread started by start_quantize, as load_data '''
+        def progress(nframes):
+            if cancel.is_set():
+                raise netdata.LoadCancelled()
+
+        try:
+            qdata, qpyramid = netdata.quantize_levels(data, pyramid, Vmin,
+                Vmax, len(self.lut), progress)
+        except netdata.LoadCancelled:
+            return
+        wx.PostEvent(self, QuantizeDoneEvent(load_id=cancel, qdata=qdata,
+            qpyramid=qpyramid, clim=(Vmin, Vmax), **tags))
+
+    def OnQuantizeDone(self, event):
+        # frames converted for color limits that have changed since are
+        # not used
+        if event.load_id is not self.cancel_load:
+            return
+        if event.clim != (self.Vmin, self.Vmax):
+            return
+        self.qdata, self.qpyramid = event.qdata, event.qpyramid
+        self.qclim = event.clim
 
     def plot_data(self):
-        ''' plot_data() shows successive frames of the data that was loaded
-            into the ldata array.  Creating a new self.im AxesImage instance
-            for each frame is extremely slow, so the set_data method of
-            AxesImage is used to load new data into the existing self.im for
-            each frame.  Normally 'self.canvas.draw()' would be used to
-            display a frame, but redrawing the entire canvas, redraws the
-            axes, labels, sliders, buttons, or anything else on the canvas.
-            This uses a method taken from an example in Ch 7, p. 192
-            Matplotlib for Python developers, with draw_artist() and blit()
-            redraw only the part that was changed.
+        ''' plot_data() starts the playback of successive frames of the data
+            that was loaded into the ldata array.  Creating a new self.im
+            AxesImage instance for each frame is extremely slow, so the
+            set_data method of AxesImage is used to load new data into the
+            existing self.im for each frame.  Normally 'self.canvas.draw()'
+            would be used to display a frame, but redrawing the entire
+            canvas, redraws the axes, labels, sliders, buttons, or anything
+            else on the canvas.  This uses a method taken from an example in
+            Ch 7, p. 192 Matplotlib for Python developers, with draw_artist()
+            and blit() redraw only the part that was changed.
+
+            The frames are shown by OnPlayTimer on the ticks of a wx.Timer,
+            so that button clicks are handled during playback.  The frame to
+            show is found from the time since play started and the target
+            rate self.fps, and frames are dropped if drawing falls behind.
+            If playback was stopped with STOP, it continues from that frame.
+            While the data is loading, playback waits at the last frame read.
 
         '''
-        if self.data_loaded == False:
+        if self.frames_ready == 0:
             # bring up a warning dialog
             msg = """
             Data for plotting has not been loaded!
@@ -430,7 +650,7 @@ class PlotFrame(wx.Frame):
             return
 
         # set color limits
-        self.im.set_clim(0.0, 1.0)
+        self.im.set_clim(self.Vmin, self.Vmax)
         self.im.set_interpolation('nearest')
         # 'None' is is slightly faster, but not implemented for MPL ver < 1.1
         # self.im.set_interpolation('None')
@@ -445,34 +665,190 @@ class PlotFrame(wx.Frame):
 
         print 'system time (seconds) = ', time.time()
 
+        first, last = self.play_window()
+        # continue from a stopped frame if it is inside the time window
+        frame_num = first
+        if self.frame_num is not None and self.frame_num != last:
+            if min(first, last) <= self.frame_num <= max(first, last):
+                frame_num = self.frame_num
+        self.start_play(frame_num)
+
+    def play_window(self):
+        ''' Return the first and last frames to play in the time window '''
         # round frame_min down and frame_max up for the time window
         frame_min = int(self.t_min/self.dt)
-        frame_max = min(int(self.t_max/self.dt) + 1, self.Ntimes)
+        frame_max = min(int(self.t_max/self.dt), self.Ntimes - 1)
+        # check to see if self.reverse_play == True
+        # then interchange frame_min, frame_max
+        if self.reverse_play == True:
+            return frame_max, frame_min
+        return frame_min, frame_max
+
+    def start_play(self, frame_num):
+        ''' Start (or restart) the playback clock at frame_num '''
+        frame_num = min(frame_num, self.frames_ready - 1)
+        self.play_start = time.time()
+        self.play_frame0 = frame_num
+        self.playing = True
+        self.show_frame(frame_num)
+        self.play_timer.Start(max(1, int(1000.0/self.fps)))
+
+    def stop_play(self):
+        self.play_timer.Stop()
+        if self.playing:
+            self.playing = False
+            print 'system time (seconds) = ', time.time()
+
+    def OnPlayTimer(self, event):
+        first, last = self.play_window()
         frame_step = self.step
-
+        if self.reverse_play == True:
+            frame_step = -self.step
+        # skip ahead to the frame that is due now
+        nframes = int((time.time() - self.play_start)*self.fps)
+        frame_num = self.play_frame0 + nframes*frame_step
+        if (frame_num - last)*frame_step >= 0:
+            frame_num = last
+            if last < self.frames_ready:
+                self.stop_play()
+        # while loading, wait at the last frame that has been read
+        frame_num = min(frame_num, self.frames_ready - 1)
+        if frame_num != self.frame_num:
+            self.show_frame(frame_num)
+
+    def show_frame(self, frame_num):
+        ''' Display frame frame_num, redrawing only the image '''
         # Displaying simulation time to the status bar is much faster
         # than updating a slider progress bar, but location isn't optimum.
-        # The check for the STOP button doesn't work because the button
-        # click is not registered until this function exits.
+        self.frame_num = frame_num
+        self.SetStatusText('time: '+str(frame_num*self.dt))
+        if self.quantize and self.qclim == (self.Vmin, self.Vmax):
+            # The frame is displayed with a lookup of the RGBA color of
+            # each cell, so matplotlib does not need to scale and color
+            # map it.
+            qframe = self.pyramid_frame(frame_num, self.qpyramid)
+            if qframe is None:
+                qframe = self.qdata[frame_num]
+            self.im.set_data(self.lut[qframe])
+        else:
+            frame = self.pyramid_frame(frame_num, self.pyramid)
+            if frame is None:
+                frame = self.ldata[frame_num]
+            if self.quantize:
+                qframe = netdata.quantize_frames(
+                    np.asarray(frame)[np.newaxis], self.Vmin, self.Vmax,
+                    len(self.lut))[0]
+                self.im.set_data(self.lut[qframe])
+            else:
+                self.im.set_data(frame)
+        self.axes.draw_artist(self.im)
+        self.canvas.blit(self.axes.bbox)
 
-        # check to see if self.reverse_play == True
-        # then interchange frame_min, frame_max, and use negative step
-        if self.reverse_play == True:
-            frame_min = min(int(self.t_max/self.dt) + 1, self.Ntimes) - 1
-            frame_max = int(self.t_min/self.dt) - 1
-            frame_step = -self.step
-        for frame_num in range(frame_min, frame_max, frame_step):
-            self.SetStatusText('time: '+str(frame_num*self.dt))
-            if self.STOP == True:
-                self.t_min = frame_num*self.dt
-                # set t_min slider ?
-                self.STOP = False
-                break
-            self.im.set_data(self.ldata[frame_num])
-            self.axes.draw_artist(self.im)
-            self.canvas.blit(self.axes.bbox)
+    def pyramid_frame(self, frame_num, pyramid):
+        '''
+        In Fast mode, return the mean or peak frame of the block that holds
+        frame_num, from the level of the time pyramid (self.pyramid, or its
+        quantized copy) that matches the step, so that the frames that are
+        skipped still show.  Return None to show the full resolution frame.
+        '''
+        level = netdata.pyramid_level(pyramid, self.step)
+        if level is None:
+            return None
+        mean, peak = pyramid[level]
+        block = frame_num >> level
+        if block >= len(mean):
+            return None
+        if self.fast_view == 'mean':
+            return mean[block]
+        return peak[block]
+
+    def OnClick(self, event):
+        '''
+        Clicking on a cell of the image, when the toolbar is not in pan or
+        zoom mode, plots the time series of that cell in a trace window.
+        '''
+        if (event.inaxes is None or event.button != 1 or
+                self.toolbar.mode or not self.data_loaded):
+            return
+        cell = self.find_cell(event)
+        if cell is None:
+            return
+        source, x, y = cell
+        trace = self.cell_trace(source, x, y)
+        if trace is None:
+            self.SetStatusText('Making the trace cache - click again soon')
+            return
+        if not self.trace_frame:
+            self.trace_frame = TraceFrame(self,
+                'Cell traces from ' + os.path.basename(self.filename))
+        t = source.t_min + np.arange(len(trace))*source.dt
+        label = 'cell %d (%d, %d)' % (y*source.NX + x, x, y)
+        if source.name:
+            label = source.name + ' ' + label
+        self.trace_frame.add_trace(t, trace, label)
+        self.trace_frame.Show()
+        self.trace_frame.Raise()
+
+    def find_cell(self, event):
+        '''
+        Return (source, x, y) for the cell of the image under the mouse
+        event, where source is the TraceSource of the data shown, or None.
+        '''
+        if event.inaxes is not self.axes or self.trace_source is None:
+            return None
+        x = int(event.xdata + 0.5)
+        y = int(event.ydata + 0.5)
+        if not (0 <= x < self.NX and 0 <= y < self.NY):
+            return None
+        return self.trace_source, x, y
+
+    def cell_trace(self, source, x, y):
+        '''
+        Return the time series of the cell at (x, y) of the TraceSource
+        source from its trace cache.  The first click starts making the
+        cache in the background, and until it is ready, the trace is read
+        from the frames, or None is returned if the frames can't be read by
+        cell.
+        '''
+        if source.traces is not None:
+            return source.traces[y*source.NX + x]
+        if source.loader is None:
+            source.loader = threading.Thread(target=self.load_traces,
+                args=(source, self.cancel_load))
+            source.loader.daemon = True
+            source.loader.start()
+        if isinstance(source.frames, np.ndarray):
+            return np.asarray(source.frames[:, y, x])
+        return None
+
+    def load_traces(self, source, cancel):
+        '''
+        load_traces runs in the thread started by cell_trace, and makes
+        (or maps) the trace cache of the frames of source, where the values
+        of each cell are stored together.  It stops if new data is loaded.
+        '''
+        def progress(nframes):
+            if cancel.is_set():
+                raise netdata.LoadCancelled()
 
-        print 'system time (seconds) = ', time.time()
+        try:
+            traces = netdata.load_trace_cache(source.filename, source.frames,
+                progress)
+        except netdata.LoadCancelled:
+            return
+        except Exception, e:
+            print 'Trace cache not made: ', e
+            traces = None
+        wx.CallAfter(self.set_traces, source, traces, cancel)
+
+    def set_traces(self, source, traces, load_id):
+        if load_id is not self.cancel_load:
+            return
+        source.traces = traces
+        if traces is None:
+            self.SetStatusText('Cell traces will be read from the frames')
+        else:
+            self.SetStatusText('Trace cache is ready')
 
     #  ------------------------------------------------------------------
     #	Define the classes and functions for getting parameter values
@@ -575,7 +951,11 @@ Dave Beeman, August 2012
         if dlg.ShowModal() == wx.ID_OK:
             self.filename = dlg.GetValue()
             # A new filename has been entered, but the data has not been read
+            if self.loader is not None:
+                self.cancel_load.set()
+            self.stop_play()
             self.data_loaded = False
+            self.frames_ready = 0
             # print "You entered: %s" % self.filename     
         dlg.Destroy()
 
@@ -620,8 +1000,17 @@ command line argument.  Then click on <strong>New Data</strong> to load the new
 data and initialize the plot.  When the plot is cleared to black,
 press <strong>Play</strong>.</p>
 
+<p>The data is loaded in the background, and the status bar shows the
+number of time steps that have been read.  <strong>Play</strong> can be
+pressed as soon as the first ones are loaded, and playback will wait for
+the rest if it catches up with the loading.  While the data is loading, the
+<strong>New Data</strong> button becomes <strong>Cancel Load</strong>, and
+can be used to stop loading the file.</p>
+
 <p>The file types recognized are plain text or text files compressed with
-bzip2.  The expected data format is one line for each output time step,
+bzip2, and GENESIS FMT1 binary files written by the disk_out object.  The
+network dimensions of a FMT1 file are found from the cell positions that
+are stored in the file.  The expected data format is one line for each output time step,
 with each line having the membrane potential value of each cell in the net.
 No time value should be given on the line.  In order to properly display
 the data, netview needs some additional information about the network and
@@ -629,6 +1018,21 @@ the data.  This can optionally be contained in a header line that precedes
 the data.  If a header is not detected, a dialog will appear asking for the
 needed parameters.</p>
 
+<p>The first time a data file is loaded, a binary copy of the data is saved
+in a cache file with the same name followed by <em>.cache</em>.  Later loads
+of the same file use the cache, and start almost immediately.  The cache is
+made again if the data file has changed.  If the cache can't be written
+(or <em>use_cache</em> is set to False in the code), a file compressed
+with <em>bzip2</em> is read through an index of its compressed blocks
+saved in a file ending in <em>.bz2idx</em>, so that moving the time
+sliders decodes only the block that holds the frame.</p>
+
+<p>The color scale covers the range of the data values.  A histogram of
+the values is made while the file is loading, and saved with the cache, so
+that setting <em>clim_percentiles</em> in the code to a pair of percentiles
+such as (1, 99) gives a color scale that is not stretched by a few very
+large values.</p>
+
 <p>It is assumed that the cells are arranged on a NX x NY grid, numbered
 from 0 (bottom left corner) to NX*NY - 1 (upper right corner).
 In order to provide this information to netview, the data file should
@@ -657,14 +1061,31 @@ cell origin</li>
 by netview.  These are available for other data analysis tools that
 need a RUNID and the location of each source.</p>
 
+<p>Clicking on a cell in the image, once the data has been loaded, plots
+the time series of that cell in a separate window, where the traces of
+other cells that are clicked are added.  The first click starts making a
+copy of the data with the values of each cell stored together, in a file
+ending in <em>.traces</em>, so that later traces appear at once.  Clicks
+are ignored while the toolbar pan or zoom tool is selected.</p>
+
 <p>The slider bars can be used to set a time window for display, and the
 <strong>Reset</strong> button can set t_min and t_max back to the defaults.
 Use the <strong>Forward/Back</strong> toggle to reverse direction of
 <strong>Play</strong>, and the <strong>Normal/Fast</strong> toggle to show
-every tenth frame.</p> <p>The <strong>Single Step</strong> button can be
-used to advance a single step at a time (or 10, if in 'Fast' mode).</p>
-
-<p>The <strong>STOP</strong> button is currently not implemented</p>
+every tenth frame.  In 'Fast' mode, each frame shown is the peak value of
+each cell over the block of sixteen frames that holds it, taken from a
+time pyramid of the data that is saved in a file ending in
+<em>.pyramid</em> next to the data file.  As a block is at least as long
+as the step, every block is shown in turn, so the skipped frames still
+show.</p> <p>The <strong>Single Step</strong> button can be used to advance
+a single step at a time (or 10, if in 'Fast' mode).</p>
+
+<p>Frames are played at a fixed rate of about 50 per second, and frames
+are skipped if the display can't keep up.  The <strong>STOP</strong> button
+stops the playback, and <strong>Play</strong> will then continue from the
+frame where it stopped.  Moving the t_min slider during playback jumps to
+the new t_min, and <strong>Reset</strong> plays from the start of the time
+window again.</p>
 <p>To plot different data, enter a new filename with <strong>File/Open</strong> and
 repeat with <strong>New Data</strong> and <strong>Play</strong>.</p>
 
@@ -711,16 +1132,22 @@ repeat with <strong>New Data</strong> and <strong>Play</strong>.</p>
     #  ---------------------------------------------------------------
 
     def OnRewind(self,event):
+        # While loading, this is the Cancel Load button
+        if self.loader is not None:
+            self.cancel_load.set()
+            return
+        self.stop_play()
+        self.frame_num = None
         self.get_data_params()
         self.init_plot()
         self.get_xyt_data()
 
     def OnReplot(self,event):
-        self.plot_data()
-        self.canvas.draw()
+        if not self.playing:
+            self.plot_data()
 
     def OnSstep(self,event):
-        if self.data_loaded == False:
+        if self.frames_ready == 0:
             # bring up a warning dialog
             msg = """
             Data for plotting has not been loaded!
@@ -731,16 +1158,14 @@ repeat with <strong>New Data</strong> and <strong>Play</strong>.</p>
             wx.MessageBox(msg, "Plot Warning", wx.OK | wx.ICON_ERROR,self)
             return
 
+        self.stop_play()
         self.t_max = min(self.t_max + self.dt, (self.Ntimes - 1)*self.dt)
         self.stmax.set_val(self.t_max)
-        frame_num = int(self.t_max/self.dt)
-        self.SetStatusText('time: '+str(frame_num*self.dt))
-        self.im.set_data(self.ldata[frame_num])
-        self.axes.draw_artist(self.im)
-        self.canvas.blit(self.axes.bbox)
+        frame_num = min(int(self.t_max/self.dt), self.frames_ready - 1)
+        self.show_frame(frame_num)
 
     def OnStop(self,event):
-        self.STOP = 'True'
+        self.stop_play()
 
     def OnForward(self,event):
         state =	 self.forward_toggle.GetValue()
@@ -754,6 +1179,9 @@ repeat with <strong>New Data</strong> and <strong>Play</strong>.</p>
             self.forward_toggle.SetLabel("  Back  ")
             self.forward_toggle.SetForegroundColour('red')
             self.forward_toggle.SetBackgroundColour('green')
+        # restart the playback clock in the new direction
+        if self.playing:
+            self.start_play(self.frame_num)
 
     def OnFast(self,event):
         state =	 self.fast_toggle.GetValue()
@@ -769,6 +1197,9 @@ repeat with <strong>New Data</strong> and <strong>Play</strong>.</p>
             self.fast_toggle.SetForegroundColour('red')
             self.fast_toggle.SetBackgroundColour('green')
             self.step = 10
+        # restart the playback clock with the new step
+        if self.playing:
+            self.start_play(self.frame_num)
 
 class MainApp(wx.App):
     def OnInit(self):
@@ -6,62 +6,50 @@
 # This version overplots the data from multiple files.
 
 import sys, os
+import multiprocessing
+from optparse import OptionParser
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.mlab as mlab
 
-def plot_file(file,format):
-    print 'Plotting %s' % file
-    t = []; y = []
-    fp = open(file, 'r')
-    for line in fp.readlines():
-        data = line.split(" ")
-        t.append(data[0]); y.append(data[1])
-    # Unlike normal pylab plots which can use lists as well as arrays,
-    # the PSD routine needs a numpy array
-    yn = np.array(y, dtype='d')
-    tn = np.array(t, dtype='d')
-    dt = tn[1] - tn[0]
-    # fourier sample rate
-    fs = 1. / dt
-
-    npts = len(yn)
-    startpt = int(0.2*fs)
-    # nfft = 2*int((npts - startpt)/2.0)
+import spectra
 
-    if (npts - startpt)%2!=0:
-        startpt = startpt + 1
+# The data before this time is skipped
+tstart = 0.2
 
-    yn = yn[startpt:]
-    tn = tn[startpt:]
-
-    nfft = len(tn)//4
-    overlap = nfft//2
+def plot_file(file,format,psd):
+    print 'Plotting %s' % file
+    # The segment length is a quarter of the data after tstart, and the
+    # periodograms of the segments were added as the file was read
 
-    print npts, nfft
-    print startpt, len(yn)
-    print np.shape(yn), np.size(yn)
+    print psd.nfft, psd.nsegments
 
-    pxx,freqs=mlab.psd(yn,NFFT=nfft,Fs=fs,noverlap=overlap,window=mlab.window_none)
+    pxx,freqs=psd.psd()
     pxx[0] = 0.0
     ax2.plot(freqs,pxx)
     print freqs[0], freqs[1], freqs[10], freqs[400]
     print pxx[0], pxx[1], pxx[10], pxx[400]
 
-def do_plot_files(filenames):
+def do_plot_files(filenames, jobs=1):
     if len(filenames) > 0:
         formats = ['k', 'r', 'b', 'g', 'm', 'c']
         plotnum = 0
+        found_files = []
         for file in filenames:
+            if os.path.exists(file):
+                found_files.append(file)
+            else:
+                print '*** Error: Incorrect file name or path specified ***'
+        # the spectra are found by jobs processes, and plotted in order
+        for file, psd, error in spectra.file_psds(found_files, tstart,
+                jobs=jobs):
             print file
             format = formats[plotnum % len(formats)]
             print format, plotnum
             try:
-                if os.path.exists(file):
-                    plot_file(file,format)
-                    plotnum = plotnum + 1
-                else:
-                    print '*** Error: Incorrect file name or path specified ***'
+                if error is not None:
+                    raise IOError(error)
+                plot_file(file,format,psd)
+                plotnum = plotnum + 1
             # I need to do better error handling!
             except:
                 print 'An error ocurred'
@@ -72,10 +60,17 @@ def do_plot_files(filenames):
         print "    plotSpectra EPSC_sum_0004sj.txt EPSC_sum_M0004*.txt \n"
         sys.exit()   
 if __name__ == "__main__":
+    parser = OptionParser(usage="%prog [OPTIONS] files")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int",
+        default=multiprocessing.cpu_count(),
+        help="number of processes for reading files (default: one per CPU)")
+    (options, args) = parser.parse_args()
     # Get the arguments (possibly wildcarded) into a list of filenames
-    filenames = sys.argv[1:]
+    filenames = args
+    if len(filenames) == 0:
+        parser.error("Please give one or more files to plot")
     # Generate a RUNID from a string like "EPSC_sum_M0004E.txt"
-    fn1 = sys.argv[1]
+    fn1 = filenames[0]
     fnbase,ext = os.path.splitext(fn1)
     # get string following final '_' and remove 1 char suffix
     runid = fnbase.split('_')[-1][:-1]
@@ -93,7 +88,7 @@ if __name__ == "__main__":
 
     ax2 = fig.add_subplot(111)
 
-    do_plot_files(filenames)
+    do_plot_files(filenames, max(1, options.jobs))
 
     ax2.set_title('Spectral Density for ' + runid + ' series')
 
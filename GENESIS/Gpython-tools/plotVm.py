@@ -8,17 +8,18 @@ import sys, os
 import matplotlib.pyplot as plt
 import numpy as np
 
+import ascdata
+import envelope
+
 def plot_file(file,format):
     print 'Plotting %s' % file
-    x = []; y = []
-    fp = open(file, 'r')
-    for line in fp.readlines():
-        data = line.split(" ")
-        x.append(data[0]); y.append(data[1])
+    data = ascdata.load_columns(file)
+    x = data[:, 0]; y = data[:, 1]
     # print "Data length is ", len(x), "Format is ", format
-    axes.plot(x, y, format)
+    # long traces are drawn as their min/max envelope at the current zoom
+    envelope.plot_envelope(axes, x, y, format)
     # use this instead, to let pyplot plot pick new colors
-    # axes.plot(x, y)
+    # envelope.plot_envelope(axes, x, y)
 
 def do_plot_files(filenames):
     if len(filenames) > 0:
@@ -3,25 +3,36 @@
 # rasterplot - a command line utility to generate rasterplots of
 # firing times for a group of neurons.  It takes a single filename
 # as argument, with a line for each cell containing the spike times separated
-# by spaces.  The times are plotted as dots with the time on the x-axis and
-# the cell number (the line number) on the y-axis.
+# by spaces, or a binary spike store file made with spikestore.py.  The
+# times are plotted as dots with the time on the x-axis and the cell number
+# (the line number) on the y-axis.  For very large
+# networks, the option '-d' plots the number of spikes of each cell in
+# each time bin as an image instead.
 
 
 import sys, os
+from optparse import OptionParser
 import matplotlib.pyplot as plt
 
+import spikedata
+
 def plot_file():
     print 'Plotting %s' % filename
-    fp = open(filename, 'r')
-    format = 'b.'
-    cell_num = 0
-    for line in fp.readlines():
-        cell_num += 1
-        y = cell_num
-        data = line.split()
-        # print data[0], data[1], data[2], data[3]
-        for x in data:
-            axes.plot(x, y, format)
+    trains = spikedata.load_spikes(filename)
+    times, offsets = trains.times, trains.offsets
+    print '%d spikes from %d cells' % (len(times), len(offsets) - 1)
+    if options.density:
+        image, (tmin, tmax) = spikedata.density_image(times, offsets,
+            options.bins)
+        im = axes.imshow(image, origin='lower', aspect='auto',
+            interpolation='nearest', cmap='hot',
+            extent=(tmin, tmax, 0.5, len(offsets) - 0.5))
+        fig.colorbar(im, ax=axes, label='spikes per bin')
+    else:
+        # all of the spikes are drawn as the markers of a single line
+        format = 'b.'
+        cells = spikedata.spike_cells(offsets) + 1
+        axes.plot(times, cells, format)
     print "Processing finished"
 
 if __name__ == "__main__":
@@ -32,11 +43,18 @@ if __name__ == "__main__":
     spaces.  The times are plotted as dots with the time on the x-axis and
     the cell number (the line number) on the y-axis.
     '''
+    parser = OptionParser(usage="%prog [OPTIONS] filename")
+    parser.add_option("-d", "--density", action="store_true",
+        dest="density", default=False,
+        help="plot the spike count of each cell in time bins as an image")
+    parser.add_option("-b", "--bins", dest="bins", type="int", default=1000,
+        help="number of time bins for the density image (default 1000)")
+    (options, args) = parser.parse_args()
     # create the plot and set size of the plot figure
     fig = plt.figure(dpi=120)
     axes = fig.add_subplot(111)
     try:
-        filename = sys.argv[1]
+        filename = args[0]
         if os.path.exists(filename):            
             plot_file()
         else:
@@ -7,74 +7,80 @@
 # each group of cells.  Typically each cell group is a horizontal row of
 # cells in the network.  Time is plotted on the x-axis, cell group (row)
 # on the y-axis, with the frequency represented by a colored filled contour
-# plot.
+# plot, or with the option '-i', an image with a colored block for each
+# time step and group, which is much faster to draw for long runs.
 
 import sys, os
+from optparse import OptionParser
 import matplotlib.pyplot as plt
 import numpy as np
 
+import spikedata
+
+def decimate(xvalues, freq_array, ncols):
+    '''
+    Average the frequencies over blocks of time steps, so that there are
+    no more than ncols of them, e.g. the width of the plot in pixels.
+    '''
+    ntimes = len(xvalues)
+    step = -(-ntimes // ncols)
+    if step <= 1:
+        return xvalues, freq_array
+    nblocks = ntimes // step
+    freq_array = freq_array[:nblocks*step].reshape(nblocks, step, -1)
+    xvalues = xvalues[:nblocks*step].reshape(nblocks, step)
+    return xvalues.mean(axis=1), freq_array.mean(axis=1)
+
 def plot_file():
     print 'Plotting %s' % filename
-    fp = open(filename, 'r')
  
     # The first line is a header with the total number of lines in file
     # (nlines) and number of values/line (ncols).  The remaining lines
-    # contain data, one line for each time interval.
+    # contain data, one line for each time interval.  They are read
+    # together as an array with a row for each cell group.
 
-    firstline = fp.readline()
-    header = firstline.split()
-    # Convert these strings to integers
-    nlines = int(header[0])
-    ncols = int(header[1])
-    # nlines includes the header
-    ntimes = nlines - 1
-    # first column is time, the rest are data for groups 1 through ngroups
-    ngroups = ncols - 1
+    xvalues, rates = spikedata.read_rate_file(filename)
 
-    # print "setting up array"
+    # For plotting, the matrix X-axis is the time, and Y-axis
+    # are the target row (cell group) indices.
+    freq_array = rates.transpose().copy()
+    ngroups = freq_array.shape[1]
 
-    # set up firing frequency matrix of times and cell groups and intialize
-    # with zeroes.  The firing frequencies for each of the ngroups cell
-    # groups will be added for the next time as each line is read
+    # If time = 0, the data is likely to be meaningless,
+    # so fill the row with zeros, instead of using the data
+    freq_array[xvalues <= 0.0] = 0.0
 
-    freq_array = np.zeros((ntimes,ngroups))
+    if options.decimate:
+        width = int(axes.bbox.width)
+        xvalues, freq_array = decimate(xvalues, freq_array, width)
 
-    # The x-axis will display the time values read from the file and added
-    xvalues = []
     # The y-axis will display the group number, from 1 through ngroups
-    yvalues = range(1,ngroups + 1,1)
-
-    line_num = 0 # following lines will have data
-    # print "array filled with zeroes"
-    for line in fp.readlines():
-        data = line.split()
-        xvalues.append(float(data[0]))  # first item is the time
-        # If time = 0, the data is likely to be meaningless,
-        # so leave the row filled with zeros, instead of adding the data
-        if (float(data[0]) <= 0.0):
-            line_num += 1
-            continue
-        # This adds the row of data following the time into the array
-        freq_array[line_num,0:ngroups] = data[1:ncols]
-        line_num += 1
-
-    # print "Matrix set up"
-
-    # For contour plotting the matrix X-axis is the time, and Y-axis
-    # are the target row (cell group) indices.
-    # for np arrays, the first index refers to x-coordinates (time)
-    # matplotlib contour plots reverse the indices and need a transpose
-
-#    cplot = plt.contourf(xvalues, yvalues, freq_array.transpose())
-    cplot = plt.contourf(xvalues, yvalues, freq_array.transpose(),15)
+    yvalues = np.arange(1, ngroups + 1)
+
+    if options.image or options.mesh:
+        # The time steps are equal, and each value is drawn as a block
+        # centered on its time and group
+        dt = xvalues[1] - xvalues[0] if len(xvalues) > 1 else 1.0
+        xedges = np.append(xvalues - dt/2.0, xvalues[-1] + dt/2.0)
+        yedges = np.arange(ngroups + 1) + 0.5
+        if options.mesh:
+            cplot = axes.pcolormesh(xedges, yedges, freq_array.transpose())
+        else:
+            cplot = axes.imshow(freq_array.transpose(), origin='lower',
+                aspect='auto', interpolation='nearest',
+                extent=(xedges[0], xedges[-1], yedges[0], yedges[-1]))
+        plt.axis(ymin=yedges[0], ymax=yedges[-1])
+    else:
+        # matplotlib contour plots reverse the indices and need a transpose
+        cplot = plt.contourf(xvalues, yvalues, freq_array.transpose(),15)
+        plt.axis(ymin=1, ymax=ngroups)
     # print "Plot created."
     lx = plt.xlabel("time (sec)")
     ly = plt.ylabel("Input Row")
     title = plt.title("Average spike frequency: "+filename)
-    plt.axis(ymin=1, ymax=ngroups)
     # An alternate color map
     # cm = plt.hot()
-    cb = plt.colorbar()
+    cb = plt.colorbar(cplot)
     print "Plot finished"
 
 if __name__ == "__main__":
@@ -101,12 +107,26 @@ if __name__ == "__main__":
        following line will differ by the width of the bin used to collect
        average firing frequencies.
 
+       With the option -i (or -m), the frequencies are plotted as an
+       image (or pcolormesh), which is much faster than a contour plot
+       for long runs with fine bins, and with -d, they are averaged over
+       blocks of time steps down to the width of the plot.
+
     '''
+    parser = OptionParser(usage="%prog [OPTIONS] filename")
+    parser.add_option("-i", "--image", action="store_true", dest="image",
+        default=False, help="plot an image instead of filled contours")
+    parser.add_option("-m", "--mesh", action="store_true", dest="mesh",
+        default=False, help="plot a pcolormesh instead of filled contours")
+    parser.add_option("-d", "--decimate", action="store_true",
+        dest="decimate", default=False,
+        help="average the time steps down to the width of the plot")
+    (options, args) = parser.parse_args()
     # create the plot and set size of the plot figure
     fig = plt.figure(dpi=120)
     axes = fig.add_subplot(111)
     try:
-        filename = sys.argv[1]
+        filename = args[0]
         if os.path.exists(filename):            
             plot_file()
         else:
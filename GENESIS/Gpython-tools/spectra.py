@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+# spectra - functions for calculating the Power Spectral Density (PSD) of
+# the time series written by the GENESIS asc_file object, such as the summed
+# Excitatory Post Synaptic Current (EPSC) files written by ACnet2-batch.g,
+# for plotPSD.py and plotPSD0.py.
+#
+# The PSD is found by Welch's method, as with the Matplotlib 'psd' function:
+# the data is divided into overlapping segments, and the periodograms of the
+# segments are averaged.  Here the periodograms are added to a running sum
+# as the data is read, one block of lines at a time, so that the PSD of a
+# long file, or the average PSD of many runs, is calculated without holding
+# all of the data in memory.  The spectra of all the cells of a netview data
+# file, such as EPSC_netview or Ex_netview, are found together by network_psd,
+# with each rfft taken along the time axis of a block of cells at once.
+
+import itertools
+import multiprocessing
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+import ascdata
+
+class WelchPSD(object):
+    '''
+    WelchPSD accumulates the periodograms of the segments of one or more
+    series of samples at the sample rate fs.  The segments have nfft points
+    and overlap by noverlap (default nfft//2), and are multiplied by the
+    window (an array of nfft values, by default a boxcar, as with
+    mlab.window_none).  Each series is given in pieces of any length with
+    add, and ended with end_series, so that segments do not span two
+    series.  If nfft is None, it is set to a quarter of the length of the
+    first series, which is held until it ends.  The samples may also be
+    a 2-D array with a column for each of several channels, such as the
+    cells of a network, whose spectra are then found together.
+    '''
+    def __init__(self, fs, nfft=None, noverlap=None, window=None):
+        self.fs = float(fs)
+        self.nfft = None
+        self.noverlap = noverlap
+        self.window = window
+        self.total = None
+        self.nsegments = 0
+        self.nseries = 0
+        self.pending = []
+        self.rest = np.zeros(0)
+        if nfft is not None:
+            self.set_nfft(nfft)
+
+    def set_nfft(self, nfft):
+        self.nfft = int(nfft)
+        if self.noverlap is None:
+            self.noverlap = self.nfft//2
+        if self.window is None:
+            self.window = np.ones(self.nfft)
+        # the sum of the periodograms, an array after the first segments
+        # are added, with a column for each channel of 2-D samples
+        self.total = 0.0
+
+    def add(self, y):
+        ''' Add the next samples y of the current series '''
+        y = np.asarray(y, dtype=np.float64)
+        if self.nfft is None:
+            self.pending.append(y)
+            return
+        if len(self.rest):
+            y = np.concatenate((self.rest, y))
+        step = self.nfft - self.noverlap
+        nseg = (len(y) - self.noverlap)//step if len(y) >= self.nfft else 0
+        if nseg > 0:
+            # a view of the overlapping segments as the rows of an array,
+            # with the channels (if any) along the last axis
+            segments = as_strided(y, shape=(nseg, self.nfft) + y.shape[1:],
+                strides=(step*y.strides[0],) + y.strides)
+            window = self.window.reshape((-1,) + (1,)*(y.ndim - 1))
+            spectra = np.fft.rfft(segments*window, axis=1)
+            self.total = self.total + \
+                (spectra.real**2 + spectra.imag**2).sum(axis=0)
+            self.nsegments += nseg
+        # keep the samples needed for the next segment
+        self.rest = y[nseg*step:].copy()
+
+    def end_series(self):
+        ''' End the current series, and drop its last partial segment '''
+        if self.nfft is None:
+            y = np.concatenate(self.pending) if self.pending else np.zeros(0)
+            self.pending = []
+            if len(y) < 4:
+                return
+            self.set_nfft(len(y)//4)
+            self.add(y)
+        self.rest = np.zeros(0)
+        self.nseries += 1
+
+    def add_file(self, filename, tstart=0.0, column=1):
+        '''
+        Add the values of column of an asc_file data file as a series,
+        from the first line with a time (the first column) of at least
+        tstart.  The file is read a block of lines at a time.
+        '''
+        for block in ascdata.iter_columns(filename):
+            if block[-1, 0] < tstart:
+                continue
+            if block[0, 0] < tstart:
+                block = block[block[:, 0] >= tstart]
+            self.add(block[:, column])
+        self.end_series()
+
+    def merge(self, other):
+        ''' Add the segments of the WelchPSD other to these '''
+        if other.nfft != self.nfft or other.fs != self.fs:
+            raise ValueError('the spectra have different lengths or rates')
+        self.total += other.total
+        self.nsegments += other.nsegments
+        self.nseries += other.nseries
+
+    def psd(self):
+        '''
+        Return the one-sided PSD averaged over all of the segments, scaled
+        as by mlab.psd, and the frequencies.  For 2-D samples, the PSD has
+        a column for each channel.
+        '''
+        if self.nsegments == 0:
+            raise ValueError('no complete segments to calculate the PSD')
+        pxx = self.total/(self.nsegments*self.fs*(self.window**2).sum())
+        # the power at negative frequencies is added to the positive ones
+        if self.nfft % 2:
+            pxx[1:] *= 2
+        else:
+            pxx[1:-1] *= 2
+        freqs = np.fft.rfftfreq(self.nfft, 1.0/self.fs)
+        return pxx, freqs
+
+def sample_rate(filename):
+    ''' Return the sample rate of a file from its first two times '''
+    for block in ascdata.iter_columns(filename, block_bytes=1 << 16):
+        if len(block) >= 2:
+            return 1.0/(block[1, 0] - block[0, 0])
+    raise ValueError('%s has fewer than two lines of data' % filename)
+
+def _file_psd(job):
+    '''
+    Return the WelchPSD of a file for file_psds, which holds only the sum
+    of the periodograms, and None, or None and an error message.
+    '''
+    filename, fs, nfft, tstart = job
+    try:
+        if fs is None:
+            fs = sample_rate(filename)
+        psd = WelchPSD(fs, nfft)
+        psd.add_file(filename, tstart)
+    except Exception, e:
+        return None, '%s: %s' % (filename, e)
+    return psd, None
+
+def file_psds(filenames, tstart=0.0, nfft=None, fs=None, jobs=1):
+    '''
+    Generator that calculates the WelchPSD of each of filenames, from time
+    tstart, and yields (filename, psd, error) in the order of filenames,
+    where error is None or a message if the file can't be read.  The
+    segment length nfft and sample rate fs are found from each file if
+    they are None.  With jobs > 1, the files are read by a pool of jobs
+    processes, which return only the small spectra to be plotted or
+    combined with WelchPSD.merge.
+    '''
+    job_list = [(f, fs, nfft, tstart) for f in filenames]
+    jobs = min(jobs, len(filenames))
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(_file_psd, job_list)
+    else:
+        pool = None
+        results = itertools.imap(_file_psd, job_list)
+    try:
+        for n, (psd, error) in enumerate(results):
+            yield filenames[n], psd, error
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+# Number of frame values read and transformed at a time by network_psd
+NETWORK_BLOCK_VALUES = 1 << 21
+
+def network_psd(frames, dt, t_min=0.0, tstart=0.0, nfft=None,
+                block_values=NETWORK_BLOCK_VALUES):
+    '''
+    Return the PSD of every cell of the (Ntimes, NY, NX) netview frames,
+    as read by netdata.load_network_frames, from the first frame at a time
+    of at least tstart, as a (nfreqs, NY, NX) array, and the frequencies.
+    The frames begin at t_min and are dt apart, and may be an array, a
+    memory mapped frame cache, or a netdata.Bz2Frames.  The PSD of each
+    cell is found by a single WelchPSD, with segments of nfft frames
+    (default a quarter of the frames used).  The frames are read once, in
+    order, in blocks of about block_values values (and at least one step
+    between segments), and the periodograms of all the cells in each
+    segment are found with one rfft along the time axis.
+    '''
+    Ntimes = len(frames)
+    cell_shape = tuple(frames.shape[1:])
+    ncells = int(np.prod(cell_shape))
+    first = max(0, int(np.ceil((tstart - t_min)/dt - 1e-6)))
+    if nfft is None:
+        nfft = (Ntimes - first)//4
+    if nfft < 2 or Ntimes - first < nfft:
+        raise ValueError('too few frames after %g sec for the PSD' % tstart)
+    psd = WelchPSD(1.0/dt, nfft)
+    step = psd.nfft - psd.noverlap
+    block_frames = max(step, block_values//ncells)
+    for i in range(first, Ntimes, block_frames):
+        block = np.asarray(frames[i:min(Ntimes, i + block_frames)])
+        psd.add(block.reshape(len(block), ncells))
+    psd.end_series()
+    pxx, freqs = psd.psd()
+    return pxx.reshape((len(freqs),) + cell_shape), freqs
+
+def power_at(pxx, freqs, frequency):
+    '''
+    Return the power of each channel of the PSD pxx at the frequency
+    closest to frequency, e.g. an (NY, NX) map of the power of a network
+    at the stimulus frequency from network_psd, and that frequency.
+    '''
+    i = np.argmin(np.abs(freqs - frequency))
+    return pxx[i], freqs[i]
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+
+# spikedata - functions for reading the spike time files plotted with
+# rasterplot.py.  These are written by make_spike_time_file in
+# analysis_funcs5.g, with a line for each cell containing its spike times
+# separated by spaces.  A cell that did not fire has an empty line.
+#
+# The spike times of all the cells are held together as a ragged array: a
+# flat array of times, and an array of offsets with an entry for each cell
+# and one more, so that the spike times of cell i (counting from 0) are
+# times[offsets[i]:offsets[i+1]].
+#
+# The spikes can also be saved in a binary spike store file, which is
+# memory mapped when it is read, so that the spikes of any cell can be found
+# without parsing text.  spikestore.py converts text files to this format,
+# and netspikes.py finds the spikes in the soma Vm data files of netview.
+
+import os
+import struct
+
+import numpy as np
+
+import ascdata
+import netdata
+
+def read_spike_text(filename, dtype=np.float64):
+    '''
+    Read a spike time file with a line for each cell, which may be
+    compressed with bzip2 or gzip, and return the flat array of times and
+    the int64 array of offsets for the cells.  The text is converted with
+    a single call to np.fromstring, and the number of spikes of each cell
+    is counted from the positions of the spaces and line breaks.
+    '''
+    fp = ascdata.open_text_file(filename)
+    try:
+        text = fp.read()
+    finally:
+        fp.close()
+    nlines = text.count('\n')
+    if text and not text.endswith('\n'):
+        nlines += 1
+    counts = ascdata.line_counts(text, nlines)
+    times = np.fromstring(text, sep=' ')
+    if times.size != counts.sum():
+        # then there is something other than numbers in the file
+        rows = [[float(x) for x in line.split()] for line in text.splitlines()]
+        counts = np.array([len(row) for row in rows], dtype=np.int64)
+        times = np.array([x for row in rows for x in row])
+    offsets = np.zeros(nlines + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return times.astype(dtype), offsets
+
+def spike_cells(offsets):
+    ''' Return the cell number (from 0) of each spike in the flat times '''
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def density_image(times, offsets, nbins, tmin=None, tmax=None):
+    '''
+    Return the (ncells, nbins) array of the number of spikes of each cell
+    in nbins equal time bins from tmin to tmax (by default the range of
+    the times), with the range used.
+    '''
+    ncells = len(offsets) - 1
+    if tmin is None:
+        tmin = times.min() if len(times) else 0.0
+    if tmax is None:
+        tmax = times.max() if len(times) else 1.0
+    if tmax <= tmin:
+        tmax = tmin + 1.0
+    binwidth = (tmax - tmin)/float(nbins)
+    # a spike at tmax goes in the last bin
+    counts = bin_counts(times, offsets, tmin, binwidth, nbins,
+        include_end=True)
+    return counts, (tmin, tmax)
+
+def bin_counts(times, offsets, tmin, binwidth, nbins, include_end=False):
+    '''
+    Return the (ncells, nbins) array of the number of spikes of each cell
+    in nbins time bins of binwidth from tmin, found with a single call to
+    np.bincount.  Spikes outside the bins are ignored, except that with
+    include_end, a spike at the end of the last bin (to within roundoff)
+    is put in it.
+    '''
+    ncells = len(offsets) - 1
+    times = np.asarray(times)
+    bins = np.floor((times - tmin)/binwidth).astype(np.int64)
+    if include_end:
+        end = tmin + (nbins + 1e-6)*binwidth
+        bins[(bins >= nbins) & (times <= end)] = nbins - 1
+    cells = spike_cells(offsets)
+    keep = (bins >= 0) & (bins < nbins)
+    counts = np.bincount(cells[keep]*nbins + bins[keep],
+        minlength=ncells*nbins)
+    return counts.reshape(ncells, nbins)
+
+def _gaussian_smooth(counts, sigma):
+    '''
+    Convolve each row of counts with a Gaussian of standard deviation
+    sigma bins, normalized to a sum of 1, using the FFT.  The rows are
+    padded with zeros, so that the ends do not wrap around.
+    '''
+    nbins = counts.shape[-1]
+    half = int(np.ceil(4*sigma))
+    n = 1
+    while n < nbins + 2*half + 1:
+        n *= 2
+    lags = np.arange(n)
+    lags = np.where(lags > n//2, lags - n, lags)
+    kernel = np.exp(-0.5*(lags/float(sigma))**2)
+    kernel[np.abs(lags) > half] = 0.0
+    kernel /= kernel.sum()
+    spectrum = np.fft.rfft(counts, n)*np.fft.rfft(kernel)
+    # remove the small negative values left by the roundoff of the FFT
+    return np.maximum(np.fft.irfft(spectrum, n)[..., :nbins], 0.0)
+
+def spike_rates(times, offsets, binwidth, tmin=0.0, tmax=None,
+                kernel='bin', width=None):
+    '''
+    Return the end times of the bins of binwidth from tmin to tmax (by
+    default the time of the last spike, which is then counted in the last
+    bin), and the (ncells, nbins) array of the firing rate (Hz) of each
+    cell in them.  The spikes of all the cells are binned together with
+    bin_counts.  kernel is one of:
+
+    'bin'      - the number of spikes in each bin / binwidth
+    'sliding'  - the number of spikes in the window of width seconds
+                 ending at the end of the bin / width
+    'gaussian' - the counts smoothed with a Gaussian with a standard
+                 deviation of width seconds / binwidth
+    '''
+    # the last spike is at the end of the last bin when tmax is the default
+    include_end = tmax is None
+    if tmax is None:
+        tmax = times.max() if len(times) else tmin + binwidth
+    nbins = max(1, int(np.ceil((tmax - tmin)/binwidth - 1e-9)))
+    counts = bin_counts(times, offsets, tmin, binwidth, nbins, include_end)
+    if kernel == 'bin':
+        rates = counts/float(binwidth)
+    elif kernel == 'sliding':
+        nwindow = max(1, int(round(width/binwidth)))
+        total = np.zeros((counts.shape[0], nbins + 1))
+        np.cumsum(counts, axis=1, out=total[:, 1:])
+        start = np.maximum(np.arange(1, nbins + 1) - nwindow, 0)
+        rates = (total[:, 1:] - total[:, start])/(nwindow*binwidth)
+    elif kernel == 'gaussian':
+        rates = _gaussian_smooth(counts.astype(np.float64),
+            width/float(binwidth))/binwidth
+    else:
+        raise ValueError('unknown rate kernel: %s' % kernel)
+    bin_times = tmin + binwidth*np.arange(1, nbins + 1)
+    return bin_times, rates
+
+def group_rates(rates, group):
+    '''
+    Return the average rates of groups of group cells, in order of cell
+    number.  For the spikes of a whole network, with group = NX, these are
+    the rates of the rows of cells.
+    '''
+    ngroups = rates.shape[0]//group
+    if ngroups*group != rates.shape[0]:
+        raise ValueError('%d cells are not groups of %d' % (rates.shape[0],
+            group))
+    return rates.reshape(ngroups, group, -1).mean(axis=1)
+
+def write_rate_file(filename, bin_times, rates, float_format='%8.3f'):
+    '''
+    Write the (ngroups, nbins) rates to filename in the format read by
+    rowrateplot.py, as written by the GENESIS frequency monitors: a header
+    line with the number of lines in the file and the number of columns,
+    then a line for each bin with its time and the rate of each group.
+    '''
+    table = np.column_stack((bin_times, np.transpose(rates)))
+    fp = open(filename, 'w')
+    try:
+        fp.write('%d %d \n' % (len(table) + 1, table.shape[1]))
+        np.savetxt(fp, table, fmt=float_format)
+    finally:
+        fp.close()
+
+def find_spikes(frames, t_min, dt, threshold=0.0, interpolate=False,
+                block_frames=netdata.BLOCK_FRAMES):
+    '''
+    Find the spikes in the (Ntimes, NY, NX) array of network Vm frames, as
+    read by netdata.load_network_frames, and return their flat array of
+    times and the offsets of the cells, numbered as y*NX + x.  A spike is a
+    step from below threshold to threshold or above.  Its time is that of
+    the first frame at or above threshold, or with interpolate = True, the
+    time at which the line between the two frames crosses threshold.  The
+    frames are read block_frames at a time, and the crossings of all the
+    cells in a block are found together.
+    '''
+    Ntimes = len(frames)
+    ncells = int(np.prod(frames.shape[1:]))
+    cell_blocks = []
+    time_blocks = []
+    last = None
+    for first in range(0, Ntimes, block_frames):
+        block = np.asarray(frames[first:first + block_frames])
+        block = block.reshape(len(block), ncells)
+        if last is None:
+            v = block
+            start = first
+        else:
+            # include the last frame of the previous block
+            v = np.concatenate((last, block))
+            start = first - 1
+        last = block[-1:]
+        above = v >= threshold
+        step, cells = np.nonzero(above[1:] & ~above[:-1])
+        if interpolate:
+            v0 = v[step, cells].astype(np.float64)
+            v1 = v[step + 1, cells]
+            times = start + step + (threshold - v0)/(v1 - v0)
+        else:
+            times = start + step + 1.0
+        cell_blocks.append(cells)
+        time_blocks.append(t_min + dt*times)
+    if not cell_blocks:
+        return np.zeros(0), np.zeros(ncells + 1, dtype=np.int64)
+    cells = np.concatenate(cell_blocks)
+    times = np.concatenate(time_blocks)
+    # a stable sort keeps the spikes of each cell in order of time
+    order = np.argsort(cells, kind='mergesort')
+    offsets = np.zeros(ncells + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells, minlength=ncells), out=offsets[1:])
+    return times[order], offsets
+
+# The spike store file begins with a fixed size header, followed by the
+# int64 offsets of the cells and the float32 spike times.  NX and NY are the
+# dimensions of the network, when the cells are the whole network in the
+# GENESIS createmap order (x varying fastest), or 0 if unknown.
+SPIKE_SUFFIX = '.spk'
+SPIKE_MAGIC = 'NVSPIKE1'
+SPIKE_HEADER_SIZE = 128
+_spike_header = struct.Struct('<8s32siiqq')
+_spike_fields = ('RUNID', 'NX', 'NY', 'ncells', 'nspikes')
+
+class SpikeTrains(object):
+    '''
+    SpikeTrains holds the spike times of a group of cells as a flat array
+    of times and an array of offsets, with the RUNID and network size from
+    a spike store file.  trains[i] is the array of spike times of cell i.
+    '''
+    def __init__(self, times, offsets, RUNID='', NX=0, NY=0):
+        self.times = times
+        self.offsets = offsets
+        self.RUNID = RUNID
+        self.NX = NX
+        self.NY = NY
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, cell):
+        return self.times[self.offsets[cell]:self.offsets[cell + 1]]
+
+    def counts(self):
+        ''' Return the number of spikes of each cell '''
+        return np.diff(self.offsets)
+
+    def cells(self):
+        ''' Return the cell number of each spike in times '''
+        return spike_cells(self.offsets)
+
+def read_spike_header(filename):
+    ''' Return the header of a spike store as a dictionary, or None '''
+    try:
+        fp = open(filename, 'rb')
+        try:
+            buf = fp.read(_spike_header.size)
+        finally:
+            fp.close()
+    except IOError:
+        return None
+    if len(buf) < _spike_header.size:
+        return None
+    values = _spike_header.unpack(buf)
+    if values[0] != SPIKE_MAGIC.encode('ascii'):
+        return None
+    info = dict(zip(_spike_fields, values[1:]))
+    info['RUNID'] = info['RUNID'].rstrip(b'\0').decode('ascii')
+    return info
+
+def is_spike_store(filename):
+    return read_spike_header(filename) is not None
+
+def write_spike_store(filename, times, offsets, RUNID='', NX=0, NY=0):
+    '''
+    Write the spike times and offsets of the cells to the spike store
+    filename.  The file is written under a temporary name, which replaces
+    any old file when it is complete.
+    '''
+    offsets = np.asarray(offsets, dtype=np.int64)
+    times = np.asarray(times, dtype=np.float32)
+    if len(offsets) < 1 or offsets[0] != 0 or offsets[-1] != len(times) \
+            or np.any(np.diff(offsets) < 0):
+        raise ValueError('offsets do not match the spike times')
+    tmpfile = filename + '.tmp%d' % os.getpid()
+    try:
+        fp = open(tmpfile, 'wb')
+        try:
+            header = _spike_header.pack(SPIKE_MAGIC.encode('ascii'),
+                RUNID.encode('ascii'), NX, NY, len(offsets) - 1, len(times))
+            fp.write(header.ljust(SPIKE_HEADER_SIZE, b'\0'))
+            offsets.tofile(fp)
+            times.tofile(fp)
+        finally:
+            fp.close()
+        os.rename(tmpfile, filename)
+    except:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        raise
+
+def open_spike_store(filename):
+    '''
+    Return the SpikeTrains of a spike store, with the offsets and times
+    memory mapped read only.
+    '''
+    info = read_spike_header(filename)
+    if info is None:
+        raise IOError('%s is not a spike store file' % filename)
+    ncells = info['ncells']
+    offsets = np.memmap(filename, dtype=np.int64, mode='r',
+        offset=SPIKE_HEADER_SIZE, shape=(ncells + 1,))
+    if info['nspikes'] == 0:
+        # a memmap can't be empty
+        times = np.zeros(0, dtype=np.float32)
+    else:
+        times = np.memmap(filename, dtype=np.float32, mode='r',
+            offset=SPIKE_HEADER_SIZE + 8*(ncells + 1),
+            shape=(info['nspikes'],))
+    return SpikeTrains(times, offsets, info['RUNID'], info['NX'], info['NY'])
+
+def load_spikes(filename):
+    '''
+    Return the SpikeTrains of filename, which is either a spike store or
+    a text file with a line of spike times for each cell.
+    '''
+    if is_spike_store(filename):
+        return open_spike_store(filename)
+    times, offsets = read_spike_text(filename)
+    return SpikeTrains(times, offsets)
+
+def read_rate_file(filename):
+    '''
+    Read a rate file in the format of write_rate_file, which may be
+    compressed, and return the array of times and the (ngroups, ntimes)
+    array of rates.  The lines after the header are converted with a
+    single call to np.fromstring.
+    '''
+    fp = ascdata.open_text_file(filename)
+    try:
+        header = fp.readline().split()
+        text = fp.read()
+    finally:
+        fp.close()
+    # nlines includes the header
+    ntimes = int(header[0]) - 1
+    ncols = int(header[1])
+    values = np.fromstring(text, sep=' ')
+    nrows = min(ntimes, values.size//ncols)
+    table = values[:nrows*ncols].reshape(nrows, ncols)
+    return table[:, 0], table[:, 1:].T
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+# spikerates - a command line utility to calculate the firing rates of the
+# cells in a spike time file (text, or a spike store made by spikestore.py
+# or netspikes.py), for any bin width, and write them in the 'nlines ncols'
+# format that is plotted with rowrateplot.py.  This replaces the GENESIS
+# frequency monitors of analysis_funcs5.g, whose bin width is fixed when the
+# simulation is run.  By default the rates are averaged over each row of
+# the network, or with --cells, written for every cell.
+#
+# Typical usage:
+#
+#    spikerates.py -b 0.005 Ex_netview_B0003.spk
+#    spikerates.py -b 0.001 -k gaussian -w 0.005 -o rates.txt B0003.spk
+
+import os
+
+from optparse import OptionParser
+
+import spikedata
+
+if __name__ == "__main__":
+    usage = "%prog [OPTIONS] spike_file"
+    parser = OptionParser(usage=usage)
+    parser.add_option("-o", "--output", dest="output", type="string",
+        help="rate file (default: spike_freq_RUNID.txt, or spike_file.rates)")
+    parser.add_option("-b", "--binwidth", dest="binwidth", type="float",
+        default=0.010, help="time between rate values (default 0.010 sec)")
+    parser.add_option("-k", "--kernel", dest="kernel", type="choice",
+        choices=['bin', 'sliding', 'gaussian'], default='bin',
+        help="bin, sliding (window of width) or gaussian (sigma of width)")
+    parser.add_option("-w", "--width", dest="width", type="float",
+        default=None, help="width of the sliding or gaussian kernel (sec)")
+    parser.add_option("-g", "--group", dest="group", type="int",
+        default=None, help="number of cells averaged in each group "
+        "(default NX, for rows of the network)")
+    parser.add_option("--cells", dest="cells", action="store_true",
+        default=False, help="write the rate of each cell")
+    parser.add_option("--tmin", dest="tmin", type="float", default=0.0,
+        help="start time (default 0.0)")
+    parser.add_option("--tmax", dest="tmax", type="float", default=None,
+        help="end time (default the last spike)")
+    (options, args) = parser.parse_args()
+
+    if len(args) != 1 or not os.path.exists(args[0]):
+        parser.error("Need one existing spike file to read")
+    if options.kernel != 'bin' and options.width is None:
+        parser.error("The %s kernel needs a --width" % options.kernel)
+    filename = args[0]
+    trains = spikedata.load_spikes(filename)
+    group = options.group
+    if options.cells:
+        group = 1
+    elif group is None:
+        group = trains.NX or 1
+    output = options.output
+    if output is None:
+        if trains.RUNID:
+            output = 'spike_freq_' + trains.RUNID + '.txt'
+        else:
+            output = filename + '.rates'
+
+    bin_times, rates = spikedata.spike_rates(trains.times, trains.offsets,
+        options.binwidth, options.tmin, options.tmax, options.kernel,
+        options.width)
+    if group > 1:
+        rates = spikedata.group_rates(rates, group)
+    spikedata.write_rate_file(output, bin_times, rates)
+    print 'Wrote rates of %d groups at %d times to %s' % (len(rates),
+        len(bin_times), output)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+# spikestore - a command line utility to convert the spike time files
+# written by make_spike_time_file in analysis_funcs5.g, with a line of spike
+# times for each cell, to the binary spike store format of spikedata.py.
+# The store is memory mapped when it is read by rasterplot.py and the other
+# spike tools, so the text does not have to be parsed again.
+#
+# Typical usage:
+#
+#    spikestore.py spike_times_B0003.txt
+#    spikestore.py --NX 48 --NY 48 -o B0003.spk spike_times_B0003.txt.bz2
+
+import os
+import re
+
+from optparse import OptionParser
+
+import spikedata
+
+def default_runid(filename):
+    ''' Return the RUNID in a name like spike_times_B0003.txt, or '' '''
+    match = re.match(r'spike_times_(\w+?)\.txt', os.path.basename(filename))
+    if match is None:
+        return ''
+    return match.group(1)
+
+def convert(filename, output, RUNID, NX, NY):
+    times, offsets = spikedata.read_spike_text(filename, dtype='float32')
+    ncells = len(offsets) - 1
+    if NX*NY not in (0, ncells):
+        print 'Warning: %s has %d cells, not NX*NY = %d' % (filename,
+            ncells, NX*NY)
+    spikedata.write_spike_store(output, times, offsets, RUNID, NX, NY)
+    print 'Wrote %d spikes of %d cells to %s' % (len(times), ncells, output)
+
+if __name__ == "__main__":
+    usage = "%prog [OPTIONS] spike_time_file ..."
+    parser = OptionParser(usage=usage)
+    parser.add_option("-o", "--output", dest="output", type="string",
+        help="spike store file (default: the file name + '.spk'), "
+        "for a single file")
+    parser.add_option("--runid", dest="runid", type="string", default=None,
+        help="RUNID of the run (default: from the file name)")
+    parser.add_option("--NX", dest="NX", type="int", default=0,
+        help="number of cells on the x-axis of the network")
+    parser.add_option("--NY", dest="NY", type="int", default=0,
+        help="number of cells on the y-axis of the network")
+    (options, args) = parser.parse_args()
+
+    if len(args) < 1:
+        parser.error("Need at least one spike time file to convert")
+    if options.output is not None and len(args) > 1:
+        parser.error("-o can only be used with a single file")
+    for filename in args:
+        if not os.path.exists(filename):
+            parser.error("File '%s' doesn't exist" % filename)
+        output = options.output
+        if output is None:
+            output = filename + spikedata.SPIKE_SUFFIX
+        RUNID = options.runid
+        if RUNID is None:
+            RUNID = default_runid(filename)
+        convert(filename, output, RUNID, options.NX, options.NY)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# test_netdata - checks of the network data functions of netdata.py.  Run
+# from this directory with
+#
+#    python -m unittest discover -p 'test_*.py'
+
+import unittest
+
+import numpy as np
+
+import netdata
+
+class PyramidLevelTest(unittest.TestCase):
+
+    levels = dict((k, None) for k in range(netdata.PYRAMID_MIN_LEVEL, 12))
+
+    def test_step_one_plays_frames(self):
+        self.assertEqual(netdata.pyramid_level(self.levels, 1), None)
+        self.assertEqual(netdata.pyramid_level(None, 10), None)
+
+    def test_every_block_shown(self):
+        # playing every step'th frame, and stopping at the last one, as
+        # netview does, must show each block of the level
+        Ntimes = 5000
+        for step in (2, 3, 5, 6, 7, 10, 12, 25, 100, 1000):
+            level = netdata.pyramid_level(self.levels, step)
+            nblocks = -(-Ntimes >> level)
+            frames = range(0, Ntimes, step) + [Ntimes - 1]
+            shown = set(n >> level for n in frames)
+            self.assertEqual(shown, set(range(nblocks)), 'step %d' % step)
+
+class QuantizeLevelsTest(unittest.TestCase):
+
+    def test_matches_frames_shown(self):
+        # the stored color indices must be those that show_frame would
+        # make from each frame
+        data = np.random.RandomState(1).randn(600, 4, 5).astype(np.float32)
+        levels = {5: (data[:576:32], data[31:576:32])}
+        qdata, qlevels = netdata.quantize_levels(data, levels, -1.0, 2.0, 256)
+        for n in (0, 255, 256, 599):
+            qframe = netdata.quantize_frames(data[n:n + 1], -1.0, 2.0, 256)[0]
+            self.assertTrue(np.array_equal(qdata[n], qframe))
+        self.assertTrue(np.array_equal(qlevels[5][1],
+            netdata.quantize_frames(levels[5][1], -1.0, 2.0, 256)))
+
+    def test_cancel(self):
+        def progress(nframes):
+            raise netdata.LoadCancelled()
+        data = np.zeros((10, 2, 2), np.float32)
+        self.assertRaises(netdata.LoadCancelled, netdata.quantize_levels,
+            data, None, 0.0, 1.0, 256, progress)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+# test_spikedata - checks of the spike binning and rate functions of
+# spikedata.py.  Run from this directory with
+#
+#    python -m unittest discover -p 'test_*.py'
+
+import os
+import unittest
+
+import numpy as np
+
+import spikedata
+
+SPIKE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'spike_times.txt')
+
+class SpikeRatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.times, self.offsets = spikedata.read_spike_text(SPIKE_FILE)
+
+    def test_every_spike_binned(self):
+        # the last spike is at the end of the last bin with the default tmax
+        for binwidth in (0.01, 0.005, 0.001, 0.0123, 0.3/7):
+            bin_times, rates = spikedata.spike_rates(self.times,
+                self.offsets, binwidth)
+            counts = np.round(rates*binwidth).sum()
+            self.assertEqual(counts, len(self.times))
+
+    def test_spike_at_bin_edge(self):
+        offsets = np.array([0, 2, 3])
+        times = np.array([0.0, 0.3, 0.1*3])
+        bin_times, rates = spikedata.spike_rates(times, offsets, 0.1)
+        self.assertEqual(len(bin_times), 3)
+        self.assertEqual(np.round(rates*0.1).sum(), 3)
+
+    def test_gaussian_rates_not_negative(self):
+        bin_times, rates = spikedata.spike_rates(self.times, self.offsets,
+            0.001, kernel='gaussian', width=0.002)
+        self.assertTrue(np.all(rates >= 0.0))
+        # some of the smoothed spikes fall before or after the bins
+        total = rates.sum()*0.001
+        self.assertTrue(0.99*len(self.times) < total <= len(self.times))
+
+if __name__ == '__main__':
+    unittest.main()